@@ -0,0 +1,218 @@
+import csv
+import os
+from datetime import datetime
+import numpy as np
+from SampleStore import SampleStore
+from RecordingWriter import RecordingWriter
+from MinMaxPyramid import MinMaxPyramid
+from SerialReader import SerialReader
+from estimatefs import estimatefs
+
+
+class Acquisition:
+    """
+    Acquisition pipeline for one probe: a SerialReader thread on its own port,
+    its own SampleStore and min/max pyramids, and its own RecordingWriter with
+    absolute output paths.
+
+    Several Acquisitions can run in one process (e.g. a finger and an ear
+    probe). Each reader drains its port in its own thread, so a busy device
+    cannot starve another, and all sample clocks are fitted against the same
+    host clock (time.perf_counter), so passing the same t0 to record() puts
+    every recording on one time base.
+
+    The recording streams to disk as it arrives, but the SampleStore keeps the
+    whole run in memory for the plots after Stop: 7 float64 channels and the
+    sample index, 64 bytes a sample or about 70 MB per probe for an hour at
+    300 Hz, plus about 5 MB for the min/max pyramids.
+    """
+
+    # Stores incoming data; data.index holds the sample numbers (n)
+    CHANNELS = ['RED',  # RED temp values
+                'IR',  # IR temp values
+                'REDamb',  # RED ambient values
+                'IRamb',  # IR ambient values
+                'REDminus',  # RED raw - RED ambient values
+                'IRminus',  # IR raw - IR ambient values
+                'ts']  # timestamp values
+
+    # device sample rate (Hz), used until the sample clock has a fit
+    NOMINAL_FS = 300
+
+    # header row of the _Volts.csv file
+    FIELDS = ['Ch : RED', 'Ch : RED AMBIENT', 'Ch : IR',
+              'Ch: IR AMBIENT', 'Ch : RED - RED AMBIENT', 'Ch : IR - IR AMBIENT', 'Timestamp']
+
+    def __init__(self, port: str, baudrate: int = 230400, nominal_fs: float = NOMINAL_FS,
+                 label: str = ''):
+        """
+        Constructor for Acquisition
+
+        Args:
+            port (str): serial port of the probe
+            baudrate (int, optional): baud rate. Defaults to 230400.
+            nominal_fs (float, optional): expected sample rate. Defaults to NOMINAL_FS.
+            label (str, optional): added to the output filenames to tell probes
+                apart, '' for a single probe. Defaults to ''.
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.nominal_fs = nominal_fs
+        self.label = label
+
+        self.reader = None  # background serial reader thread
+        self.writer = None  # background recording writer thread
+        self.clockinfo = {}  # sample clock summary of the last run
+        self.prefix = None  # absolute path of the recording, without suffix
+        self.clear()
+
+    def clear(self):
+        """
+        Starts a fresh store, so plots of the previous run keep their data
+        """
+        self.data = SampleStore(self.CHANNELS)
+        data = self.data
+        self.pyramids = {name: MinMaxPyramid(lambda name=name: data[name])
+                         for name in ('REDminus', 'IRminus')}
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def open(self):
+        """
+        Opens the port and starts the reader thread. Raises
+        serial.SerialException if the port cannot be opened.
+        """
+        self.reader = SerialReader(self.port, self.baudrate, nominal_fs=self.nominal_fs)
+        print("\nSerial port now open. Configuration:\n")
+        print(self.reader.arduino, "\n")  # print serial parameters
+        self.reader.start()
+
+    def close(self):
+        """
+        Stops the reader thread, which closes the serial port
+        """
+        if self.reader is None:
+            return
+        self.reader.stop()
+        self.drain()  # collects whatever arrived before the port closed
+        self.clockinfo = self.reader.clock.summary()
+
+        # gaps in the stored timestamps; the rate from them is only needed
+        # when the clock model never got a fit
+        est = estimatefs(self.data['ts'])
+        if self.clockinfo['fs'] is None:
+            self.clockinfo['fs'] = est['fs']
+        self.clockinfo['gaps'] = len(est['gaps'])
+        self.clockinfo['gap_s'] = float(est['gaps'][:, 1].sum())
+        print(self.port, "sample clock =", self.clockinfo)
+        print(self.port, "samples read =", self.reader.samples, ", skipped =",
+              self.reader.skipped, ", dropped frames =", self.reader.dropped,
+              ", buffer overflows =", self.reader.ring.overflows)
+        self.reader = None
+
+    def drain(self) -> int:
+        """Moves the samples collected by the reader thread into the store
+
+        Returns:
+            int: number of new samples
+        """
+        if self.reader is None:
+            return 0
+        rows = self.reader.ring.pop()
+        if len(rows) == 0:
+            return 0
+        redminus = rows[:, 0] - rows[:, 2]
+        irminus = rows[:, 1] - rows[:, 3]
+
+        # RED, IR, REDamb, IRamb, RED - REDamb, IR - IRamb, timestamp
+        self.data.append(np.column_stack((
+            rows[:, :4], redminus, irminus, rows[:, 4])))
+        for pyramid in self.pyramids.values():
+            pyramid.update()
+
+        if self.writer is not None:
+            # CSV column order, see FIELDS
+            self.writer.append(np.column_stack((
+                rows[:, 0], rows[:, 2], rows[:, 1], rows[:, 3], redminus,
+                irminus, rows[:, 4])))
+        return len(rows)
+
+    def filename(self, suffix: str) -> str:
+        """Path of an output file of this probe
+
+        Args:
+            suffix (str): e.g. '_Volts.csv'
+
+        Returns:
+            str: absolute path
+        """
+        label = '_' + self.label if self.label else ''
+        return self.prefix + label + suffix
+
+    def record(self, prefix: str, patient: str = '', injection: str = '',
+               recording_format: str = 'csv', t0: float = None):
+        """Starts streaming samples to <prefix>[_label]_Volts.<recording_format>
+
+        Args:
+            prefix (str): absolute path of the recording without suffix,
+                e.g. .../Data/<folder>/<folder>
+            patient (str, optional): patient ID. Defaults to ''.
+            injection (str, optional): injection ID. Defaults to ''.
+            recording_format (str, optional): 'csv' or 'bin'. Defaults to 'csv'.
+            t0 (float, optional): shared host time the timestamps are written
+                relative to. Defaults to the first recorded sample.
+        """
+        self.prefix = prefix
+        self.writer = RecordingWriter(self.filename('_Volts.' + recording_format),
+                                      self.FIELDS, patient=patient,
+                                      injection=injection, t0=t0)
+        self.writer.start()
+        print("Created File", self.writer.filename)
+
+    def finish(self, SaO2: str, HbO2: str):
+        """Finishes the recording and writes the sample clock next to it
+
+        Args:
+            SaO2 (str): oxygen saturation entered by the user
+            HbO2 (str): total hemoglobin entered by the user
+        """
+        if self.writer is None:
+            return
+        self.writer.finalize(SaO2, HbO2, self.clockinfo.get('fs'))
+        print(self.writer.filename, "rows written =", self.writer.rows_written)
+        self.writer = None
+
+        # measured sample rate and drift, so processing need not estimate fs
+        with open(self.filename('_Clock.csv'), 'w', newline='') as f:
+            wc = csv.writer(f)
+            for key, value in self.clockinfo.items():
+                wc.writerow([key, value])
+
+
+def portlabel(port: str) -> str:
+    """Short filename-safe name for a serial port (COM3 -> COM3, /dev/ttyUSB0 -> ttyUSB0)
+
+    Args:
+        port (str): serial port
+
+    Returns:
+        str: label
+    """
+    return ''.join(c for c in os.path.basename(port) if c.isalnum())
+
+
+def recordingname(patient: str, injection: str, now: datetime = None) -> str:
+    """Name of the recording folder and file prefix, e.g. DH-001_ICG-01_2023518_93012
+
+    Args:
+        patient (str): patient ID
+        injection (str): injection ID
+        now (datetime, optional): start of the recording. Defaults to now.
+
+    Returns:
+        str: recording name
+    """
+    now = now or datetime.now()
+    return (f'{patient}_{injection}_{now.year}{now.month}{now.day}' +
+            f'_{now.hour}{now.minute}{now.second}')
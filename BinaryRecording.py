@@ -0,0 +1,238 @@
+"""
+Binary recording format, an alternative to the _Volts.csv file.
+
+A recording is a fixed 1024 byte header followed by little-endian float64
+column chunks. Each chunk holds chunk_rows values of every channel, one
+channel after another, and the last chunk is zero padded, so the whole body
+can be memory-mapped as an (nchunks, nchannels, chunk_rows) array.
+
+Header layout (little-endian):
+
+    magic       8s    b'DHPDREC\\x00'
+    version     u2
+    nchannels   u2
+    chunk_rows  u4
+    nrows       u8    number of valid rows, written when the file is closed
+    SaO2        f8
+    HbO2        f8
+    fs          f8    sample rate in Hz (0 if unknown)
+    patient     64s   patient ID, utf-8, null padded
+    injection   64s   injection ID, utf-8, null padded
+    channels    nchannels x 32s channel names
+"""
+
+import csv
+import os
+import struct
+import numpy as np
+
+MAGIC = b'DHPDREC\x00'
+VERSION = 1
+HEADER_SIZE = 1024
+_FIXED = struct.Struct('<8sHHIQddd64s64s')
+_NAME = struct.Struct('<32s')
+
+
+def _encode(text: str, size: int) -> bytes:
+    return str(text).encode('utf-8')[:size]
+
+
+def _decode(raw: bytes) -> str:
+    return raw.rstrip(b'\x00').decode('utf-8')
+
+
+class BinaryRecordingWriter:
+    """
+    Writes a binary recording a block of rows at a time
+    """
+
+    def __init__(self, filename: str, channels: list, patient: str = '',
+                 injection: str = '', chunk_rows: int = 4096):
+        """
+        Constructor for BinaryRecordingWriter
+
+        Args:
+            filename (str): path of the recording to create
+            channels (list): channel names, in column order
+            patient (str, optional): patient ID. Defaults to ''.
+            injection (str, optional): injection ID. Defaults to ''.
+            chunk_rows (int, optional): rows per column chunk. Defaults to 4096.
+        """
+        if _FIXED.size + len(channels) * _NAME.size > HEADER_SIZE:
+            raise ValueError("Too many channels for the recording header")
+        self.filename = filename
+        self.channels = list(channels)
+        self.patient = patient
+        self.injection = injection
+        self.chunk_rows = chunk_rows
+        self.nrows = 0
+
+        # rows waiting to fill the current chunk
+        self._chunk = np.zeros((len(self.channels), chunk_rows), dtype='<f8')
+        self._fill = 0
+
+        self._file = open(filename, 'wb')
+        self._write_header(0, 0, 0)
+
+    def _write_header(self, SaO2: float, HbO2: float, fs: float):
+        header = _FIXED.pack(MAGIC, VERSION, len(self.channels), self.chunk_rows,
+                             self.nrows, SaO2, HbO2, fs,
+                             _encode(self.patient, 64), _encode(self.injection, 64))
+        header += b''.join(_NAME.pack(_encode(c, 32)) for c in self.channels)
+        self._file.seek(0)
+        self._file.write(header.ljust(HEADER_SIZE, b'\x00'))
+
+    def append(self, rows: np.ndarray):
+        """Adds rows, writing every chunk that fills up
+
+        Args:
+            rows (ndarray): (n, nchannels) values in channel order
+        """
+        i = 0
+        while i < len(rows):
+            n = min(len(rows) - i, self.chunk_rows - self._fill)
+            self._chunk[:, self._fill:self._fill + n] = rows[i:i + n].T
+            self._fill += n
+            i += n
+            if self._fill == self.chunk_rows:
+                self._file.write(self._chunk.tobytes())
+                self._fill = 0
+        self.nrows += len(rows)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self, SaO2: float = 0, HbO2: float = 0, fs: float = 0):
+        """Writes the zero padded last chunk, completes the header and closes
+
+        Args:
+            SaO2 (float, optional): oxygen saturation. Defaults to 0.
+            HbO2 (float, optional): total hemoglobin. Defaults to 0.
+            fs (float, optional): sample rate in Hz. Defaults to 0.
+        """
+        if self._fill:
+            self._chunk[:, self._fill:] = 0
+            self._file.write(self._chunk.tobytes())
+            self._fill = 0
+        self._write_header(float(SaO2), float(HbO2), float(fs))
+        self._file.close()
+
+
+class BinaryRecording:
+    """
+    Memory-mapped reader for binary recordings
+    """
+
+    def __init__(self, filename: str):
+        """
+        Constructor for BinaryRecording
+        """
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or header[:8] != MAGIC:
+            raise ValueError("Not a binary recording: " + filename)
+
+        (_, self.version, nchannels, self.chunk_rows, self.nrows, self.SaO2,
+         self.HbO2, self.fs, patient, injection) = _FIXED.unpack_from(header)
+        self.patient = _decode(patient)
+        self.injection = _decode(injection)
+        self.channels = [
+            _decode(_NAME.unpack_from(header, _FIXED.size + i * _NAME.size)[0])
+            for i in range(nchannels)]
+
+        nchunks = -(-self.nrows // self.chunk_rows)
+        if nchunks:
+            self.chunks = np.memmap(filename, dtype='<f8', mode='r',
+                                    offset=HEADER_SIZE,
+                                    shape=(nchunks, nchannels, self.chunk_rows))
+        else:
+            self.chunks = np.zeros((0, nchannels, self.chunk_rows))
+
+    def __len__(self):
+        return self.nrows
+
+    def column(self, name) -> np.ndarray:
+        """Returns one channel as a contiguous array
+
+        Args:
+            name (str or int): channel name or column number
+
+        Returns:
+            ndarray: (nrows,) values
+        """
+        c = self.channels.index(name) if isinstance(name, str) else name
+        return self.chunks[:, c, :].reshape(-1)[:self.nrows]
+
+    def toarray(self) -> np.ndarray:
+        """
+        Returns all channels as an (nrows, nchannels) array, like np.loadtxt
+        """
+        return np.ascontiguousarray(
+            self.chunks.transpose(0, 2, 1).reshape(-1, len(self.channels))[:self.nrows])
+
+
+def csv_to_binary(csv_file: str, bin_file: str, patient: str = None,
+                  injection: str = None):
+    """Converts a _Volts.csv recording to the binary format
+
+    Args:
+        csv_file (str): input CSV (SaO2 row, HbO2 row, field names, data)
+        bin_file (str): output binary recording
+        patient (str, optional): patient ID. Defaults to the one in the filename.
+        injection (str, optional): injection ID. Defaults to the one in the filename.
+    """
+    with open(csv_file, 'r', newline='') as f:
+        rc = csv.reader(f)
+        SaO2 = float(next(rc)[0])
+        HbO2 = float(next(rc)[0])
+        fields = next(rc)
+        X = np.loadtxt(f, delimiter=',', ndmin=2)
+
+    # filenames look like <patient>_<injection>_<date>_<time>_Volts.csv
+    parts = os.path.basename(csv_file).split('_')
+    if patient is None:
+        patient = parts[0] if len(parts) > 2 else ''
+    if injection is None:
+        injection = parts[1] if len(parts) > 2 else ''
+
+    fs = 0
+    if 'Timestamp' in fields and len(X) > 1:
+        t = X[:, fields.index('Timestamp')]
+        if t[-1] > t[0]:
+            fs = (len(t) - 1) / (t[-1] - t[0])
+
+    w = BinaryRecordingWriter(bin_file, fields, patient, injection)
+    w.append(X)
+    w.close(SaO2, HbO2, fs)
+
+
+def binary_to_csv(bin_file: str, csv_file: str):
+    """Converts a binary recording back to the _Volts.csv layout
+
+    Args:
+        bin_file (str): input binary recording
+        csv_file (str): output CSV
+    """
+    rec = BinaryRecording(bin_file)
+    X = rec.toarray()
+    with open(csv_file, 'w', newline='') as f:
+        wc = csv.writer(f)
+        wc.writerow([rec.SaO2])
+        wc.writerow([rec.HbO2])
+        wc.writerow(rec.channels)
+        for i in range(0, len(X), 10000):
+            wc.writerows(X[i:i + 10000].tolist())
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python BinaryRecording.py <input> <output>, direction from the extension
+    if len(sys.argv) != 3:
+        print("usage: python BinaryRecording.py <in.csv|in.bin> <out.bin|out.csv>")
+        sys.exit(1)
+    if sys.argv[1].endswith('.csv'):
+        csv_to_binary(sys.argv[1], sys.argv[2])
+    else:
+        binary_to_csv(sys.argv[1], sys.argv[2])
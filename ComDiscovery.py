@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import serial.tools.list_ports
+
+
+class ComDiscovery(threading.Thread):
+    """
+    Finds the densitometer's serial port without opening any port.
+
+    Ports are ranked from list_ports metadata only (opening a port can reset
+    an Arduino): first the USB identities (VID, PID, serial number) of the
+    probes used last, cached in a small JSON file, then known Arduino /
+    USB-serial bridge vendor IDs, then 'USB Serial Device' descriptions, then
+    everything else. The list is refreshed in the background, so plugging the
+    probe in after startup is picked up without blocking the GUI.
+    """
+
+    # USB vendor IDs of the boards and USB-serial bridges used in probes
+    KNOWN_VIDS = {0x2341: 'Arduino', 0x2A03: 'Arduino', 0x1A86: 'CH340',
+                  0x0403: 'FTDI', 0x10C4: 'CP210x'}
+
+    def __init__(self, cache_file: str = 'probe_port.json', interval: float = 2.0):
+        """
+        Constructor for ComDiscovery
+
+        Args:
+            cache_file (str, optional): where the last probes' identities are
+                kept, e.g. in the Data folder. Defaults to 'probe_port.json'.
+            interval (float, optional): seconds between rescans. Defaults to 2.0.
+        """
+        super().__init__(daemon=True)
+        self.cache_file = cache_file
+        self.interval = interval
+        self.ports = []  # port names, best match first; replaced on every scan
+        self.probe = None  # most likely probe port, None if no candidate
+        self.remembered = []  # current ports of the probes used last, in their order
+        self.known = self._load()  # identities of the probes used last
+        self._stop_event = threading.Event()
+
+    def _load(self) -> list:
+        try:
+            with open(self.cache_file, 'r') as f:
+                known = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return known if isinstance(known, list) else []
+
+    def rank(self, info) -> int:
+        """Ranks a port by how likely it is to be the probe (lower is better)
+
+        Args:
+            info (ListPortInfo): port metadata from list_ports
+
+        Returns:
+            int: 0 last used probe, 1 known vendor, 2 USB serial device, 3 other
+        """
+        if info.vid is not None and any(
+                info.vid == probe.get('vid') and info.pid == probe.get('pid')
+                and info.serial_number == probe.get('serial_number')
+                for probe in self.known):
+            return 0
+        if info.vid in self.KNOWN_VIDS:
+            return 1
+        if 'USB Serial Device' in (info.description or ''):
+            return 2
+        return 3
+
+    def scan(self):
+        """
+        Lists the ports (best match first), picks the likely probe port and
+        finds the remembered probes
+        """
+        infos = serial.tools.list_ports.comports(include_links=False)
+        ranked = sorted((self.rank(info), info.device) for info in infos)
+
+        # a remembered probe may come back on a different port name
+        remembered = []
+        for probe in self.known:
+            for info in infos:
+                if (info.vid is not None and info.device not in remembered and
+                        (info.vid, info.pid, info.serial_number) ==
+                        (probe.get('vid'), probe.get('pid'), probe.get('serial_number'))):
+                    remembered.append(info.device)
+                    break
+
+        # ports last: the GUI reacts to it changing and then reads the others
+        self.remembered = remembered
+        self.probe = ranked[0][1] if ranked and ranked[0][0] < 3 else None
+        self.ports = [device for _, device in ranked]
+
+    def remember(self, ports: list):
+        """Caches the USB identities of the ports the probes were found on
+
+        Args:
+            ports (list): ports that were opened successfully, in order
+        """
+        infos = {info.device: info for info in
+                 serial.tools.list_ports.comports(include_links=False)}
+        known = [{'vid': infos[port].vid, 'pid': infos[port].pid,
+                  'serial_number': infos[port].serial_number, 'port': port}
+                 for port in ports if port in infos and infos[port].vid is not None]
+        if not known:
+            return
+        self.known = known
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+            with open(self.cache_file, 'w') as f:
+                json.dump(self.known, f)
+        except OSError as e:
+            print("could not save probe identities:", e)
+
+    def run(self):
+        """
+        Rescans the ports every interval seconds until stop()
+        """
+        while True:
+            try:
+                self.scan()
+            except Exception as e:  # list_ports can fail while devices change
+                print("port scan failed:", e)
+            if self._stop_event.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,184 @@
+"""
+Heart-rate band-pass filters for TI_to_AIF, designed once and reused.
+
+bandpass() memoizes the remezord + remez design on (fs, band edges, ripples,
+length algorithm), so repeated runs in one process skip the design. A
+FilterBank additionally keeps taps for a grid of heart rates on disk
+(AIF_Processing/filterbank_<fs>Hz.npz), loaded on first use, so batch runs
+never design at all:
+
+    python FilterBank.py --fs 300 --hr-min 30 --hr-max 200 --step 0.25
+"""
+
+import argparse
+import os
+from functools import lru_cache
+import numpy as np
+from scipy import signal
+from remezord import remezord
+
+
+def upennspec(fhr: float) -> tuple:
+    """Band edges and ripples of the 'upenn' band-pass around the heart rate
+
+    Args:
+        fhr (float): heart rate (Hz)
+
+    Returns:
+        tuple: (edges, rips) for bandpass()
+    """
+    fhwid = 0.10
+    fl = (1 - fhwid) * fhr
+    fh = (1 + fhwid) * fhr
+
+    # Correcting stopband and passband values for remezord
+    A_SB_inp = 60
+    A_SB = 10.**(-A_SB_inp/20.)
+    A_PB_inp = 1
+    A_PB = (10. ** (A_PB_inp / 20.) - 1) / \
+        (10 ** (A_PB_inp / 20.) + 1) * 2
+    A_SB2_inp = 60
+    A_SB2 = 10. ** (-A_SB2_inp / 20.)
+
+    return (fl - 0.2, fl, fh, fh + 0.2), (A_SB, A_PB, A_SB2)
+
+
+@lru_cache(maxsize=64)
+def bandpass(fs: float, edges: tuple, rips: tuple, alg: str = 'ichige') -> np.ndarray:
+    """Designs (or returns the cached) remez band-pass filter
+
+    Args:
+        fs (float): sampling rate
+        edges (tuple): stop, pass, pass, stop band edges (Hz)
+        rips (tuple): linear ripples of the three bands
+        alg (str, optional): remezord length algorithm. Defaults to 'ichige'.
+
+    Returns:
+        ndarray: read-only taps
+    """
+    # Generate remez filter parameters with remezord
+    (N_upenn, F_upenn, A_upenn, W_upenn) = \
+        remezord(list(edges), [1, 0, 1], list(rips), Hz=fs, alg=alg)
+
+    # Generate taps using remez
+    taps = signal.remez(N_upenn, F_upenn*fs, [0, 1, 0], weight=W_upenn, fs=fs)
+    taps.setflags(write=False)  # shared between callers
+    return taps
+
+
+class FilterBank:
+    """
+    Precomputed 'upenn' taps for a grid of heart rates at one sampling rate
+    """
+
+    def __init__(self, filename: str):
+        """
+        Constructor for FilterBank
+
+        Args:
+            filename (str): .npz file written by build()
+        """
+        self.filename = filename
+        self._loaded = False
+
+    def _load(self):
+        with np.load(self.filename) as bank:
+            self.fs = float(bank['fs'])
+            self.hr = bank['hr']
+            self.offsets = bank['offsets']
+            self.taps = bank['taps']
+        self.taps.setflags(write=False)
+        self._loaded = True
+
+    def lookup(self, fs: float, hr: float) -> np.ndarray:
+        """Taps for the grid heart rate nearest to hr
+
+        Args:
+            fs (float): sampling rate; must be within 0.1 % of the bank's
+            hr (float): heart rate (bpm)
+
+        Returns:
+            ndarray: taps, or None if fs or hr is outside the bank
+        """
+        if not self._loaded:
+            self._load()
+        if abs(fs - self.fs) > 1e-3 * self.fs or len(self.hr) == 0:
+            return None
+        step = self.hr[1] - self.hr[0] if len(self.hr) > 1 else 0
+        k = int(np.argmin(np.abs(self.hr - hr)))
+        if abs(self.hr[k] - hr) > step / 2:
+            return None
+        return self.taps[self.offsets[k]:self.offsets[k + 1]]
+
+    @staticmethod
+    def build(filename: str, fs: float, hr_min: float = 30, hr_max: float = 200,
+              step: float = 0.25):
+        """Designs the taps for every grid heart rate and saves them
+
+        Args:
+            filename (str): .npz file to write
+            fs (float): sampling rate
+            hr_min (float, optional): lowest heart rate (bpm). Defaults to 30.
+            hr_max (float, optional): highest heart rate (bpm). Defaults to 200.
+            step (float, optional): grid spacing (bpm). Defaults to 0.25.
+        """
+        hr = np.arange(hr_min, hr_max + step / 2, step)
+        taps = []
+        for h in hr:
+            edges, rips = upennspec(h / 60)
+            taps.append(bandpass(fs, edges, rips))
+            bandpass.cache_clear()  # the bank is the cache here
+        offsets = np.concatenate(([0], np.cumsum([len(t) for t in taps])))
+        np.savez(filename, fs=fs, hr=hr, offsets=offsets, taps=np.concatenate(taps))
+
+
+_banks = {}  # FilterBank per file, loaded on first lookup
+
+
+def bankfile(directory: str, fs: float) -> str:
+    """
+    Path of the filter bank for a sampling rate (rounded to whole Hz)
+    """
+    return os.path.join(directory, 'filterbank_%dHz.npz' % round(fs))
+
+
+def upenntaps(fhr: float, fs: float, directory: str = None) -> np.ndarray:
+    """Band-pass taps around the heart rate, from the bank if there is one
+
+    The bank snaps the heart rate to its grid; without a bank (or outside
+    its range) the exact heart rate is designed, memoized by bandpass().
+
+    Args:
+        fhr (float): heart rate (Hz)
+        fs (float): sampling rate
+        directory (str, optional): folder holding filter banks, e.g.
+            AIF_Processing. Defaults to None (no bank).
+
+    Returns:
+        ndarray: read-only taps
+    """
+    if directory is not None:
+        filename = bankfile(directory, fs)
+        if filename not in _banks and os.path.exists(filename):
+            _banks[filename] = FilterBank(filename)
+        if filename in _banks:
+            taps = _banks[filename].lookup(fs, 60 * fhr)
+            if taps is not None:
+                return taps
+
+    edges, rips = upennspec(fhr)
+    return bandpass(float(fs), edges, rips)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the heart-rate filter bank")
+    parser.add_argument('--fs', type=float, default=300, help="sampling rate (Hz)")
+    parser.add_argument('--hr-min', type=float, default=30, help="bpm")
+    parser.add_argument('--hr-max', type=float, default=200, help="bpm")
+    parser.add_argument('--step', type=float, default=0.25, help="bpm")
+    parser.add_argument('--dir', default='AIF_Processing')
+    args = parser.parse_args()
+
+    filename = bankfile(args.dir, args.fs)
+    FilterBank.build(filename, args.fs, args.hr_min, args.hr_max, args.step)
+    print("filter bank written to", filename)
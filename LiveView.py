@@ -0,0 +1,183 @@
+import numpy as np
+
+
+class LiveView:
+    """
+    Live auto-scrolling RED/IR (ambient subtracted) display on the GUI canvas.
+
+    Lines are drawn with artist blitting: the axes, ticks and labels are
+    rendered once into a cached background and each frame only restores that
+    background and redraws the two lines over the last window_s seconds. The x
+    axis is fixed at [-window_s, 0] seconds, so scrolling never needs a full
+    redraw; one happens only when the signal leaves the current y limits.
+
+    During a recording a StreamingAIF can be given too; its concentration trace
+    (one point per beat) is drawn in a third panel against recording time.
+    """
+
+    def __init__(self, fig, canvas, window_s: float = 10, fps: float = 15,
+                 max_points: int = 2000):
+        """
+        Constructor for LiveView
+
+        Args:
+            fig (Figure): GUI figure to draw in
+            canvas (FigureCanvasTkAgg): canvas holding fig
+            window_s (float, optional): seconds of signal shown. Defaults to 10.
+            fps (float, optional): maximum frame rate. Defaults to 15.
+            max_points (int, optional): points drawn per line. Defaults to 2000.
+        """
+        self.fig = fig
+        self.canvas = canvas
+        self.window_s = window_s
+        self.fps = fps
+        self.max_points = max_points
+
+        self.root = None
+        self.data = None
+        self.pyramids = None
+        self.running = False
+        self.background = None
+        self._after = None
+        self._cid = None
+        self.aif = None
+
+    def start(self, root, data, pyramids: dict = None, aif=None):
+        """Sets up the axes and starts updating at the frame rate
+
+        Args:
+            root (Tk): GUI root, used for scheduling frames
+            data (SampleStore): store being filled by the acquisition
+            pyramids (dict, optional): MinMaxPyramid per channel name; when given
+                the lines show the min/max envelope instead of strided samples
+            aif (StreamingAIF, optional): also draws its live concentration trace
+        """
+        self.root = root
+        self.data = data
+        self.pyramids = pyramids
+        self.aif = aif
+        self.running = True
+
+        self.fig.clf()
+        if aif is None:
+            self.ax_ir, self.ax_red = self.fig.subplots(nrows=2, sharex=True)
+        else:
+            self.ax_ir = self.fig.add_subplot(311)
+            self.ax_red = self.fig.add_subplot(312, sharex=self.ax_ir)
+            self.ax_aif = self.fig.add_subplot(313)
+            (self.line_aif,) = self.ax_aif.plot([], [], color='green', animated=True)
+            self.ax_aif.set_ylabel('ICG (uM)')
+            self.ax_aif.set_xlabel('recording time (sec)')
+            self.ax_aif.set_xlim(0, 120)
+        (self.line_ir,) = self.ax_ir.plot([], [], animated=True)
+        (self.line_red,) = self.ax_red.plot([], [], color='darkred', animated=True)
+        self.ax_ir.set_ylabel('IR Raw - Ambient (V)')
+        self.ax_red.set_ylabel('Red Raw - Ambient (V)')
+        self.ax_red.set_xlabel('time (sec)')
+        self.ax_red.set_xlim(-self.window_s, 0)
+        self.fig.subplots_adjust(left=.18)
+
+        # any full redraw (including window resizes) refreshes the background
+        self._cid = self.canvas.mpl_connect('draw_event', self._on_draw)
+
+        # placing the canvas on the Tkinter window
+        self.root.geometry("525x715")
+        self.canvas.get_tk_widget().grid(row=9, columnspan=3, padx=10)
+        self.canvas.draw()
+
+        self.update()
+
+    def stop(self):
+        """
+        Stops updating and removes the live plot from the GUI
+        """
+        if self.root is None:  # Stop pressed before Start
+            return
+        self.running = False
+        if self._after is not None:
+            self.root.after_cancel(self._after)
+            self._after = None
+        if self._cid is not None:
+            self.canvas.mpl_disconnect(self._cid)
+            self._cid = None
+        self.fig.clf()
+        self.canvas.get_tk_widget().grid_remove()
+        self.root.geometry("400x285")
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_lines()
+
+    def _window(self) -> tuple:
+        """Finds the samples inside the visible window
+
+        Returns:
+            tuple: (t, IR, RED) with t in seconds relative to the newest sample
+        """
+        ts = self.data['ts']
+        if len(ts) == 0:
+            return np.empty(0), np.empty(0), np.empty(0)
+        first = np.searchsorted(ts, ts[-1] - self.window_s)
+
+        if self.pyramids is not None:
+            idx, ir = self.pyramids['IRminus'].query(first, len(ts), self.max_points)
+            _, red = self.pyramids['REDminus'].query(first, len(ts), self.max_points)
+            return ts[idx] - ts[-1], ir, red
+
+        # keep the cost per frame fixed whatever the sample rate
+        step = max(1, -(-(len(ts) - first) // self.max_points))
+        t = ts[first::step] - ts[-1]
+        return (t, self.data['IRminus'][first::step],
+                self.data['REDminus'][first::step])
+
+    def _rescale(self, ax, y: np.ndarray) -> bool:
+        """Widens the y limits when the signal leaves them
+
+        Returns:
+            bool: True if the limits changed (so a full redraw is needed)
+        """
+        lo, hi = ax.get_ylim()
+        ymin, ymax = float(np.min(y)), float(np.max(y))
+        if ymin >= lo and ymax <= hi and (ymax - ymin) > 0.25 * (hi - lo):
+            return False
+        pad = 0.1 * (ymax - ymin) or 0.01
+        ax.set_ylim(ymin - pad, ymax + pad)
+        return True
+
+    def _draw_lines(self):
+        self.ax_ir.draw_artist(self.line_ir)
+        self.ax_red.draw_artist(self.line_red)
+        if self.aif is not None:
+            self.ax_aif.draw_artist(self.line_aif)
+
+    def update(self):
+        """
+        Draws one frame and schedules the next one
+        """
+        if not self.running:
+            return
+
+        t, ir, red = self._window()
+        self.line_ir.set_data(t, ir)
+        self.line_red.set_data(t, red)
+
+        rescaled = bool(len(t)) and (self._rescale(self.ax_ir, ir) | self._rescale(self.ax_red, red))
+        if self.aif is not None:
+            tir, Ci = self.aif.trace()
+            self.line_aif.set_data(tir, Ci)
+            if len(tir) and np.all(np.isfinite(Ci)):
+                rescaled |= self._rescale(self.ax_aif, Ci)
+                if tir[-1] > self.ax_aif.get_xlim()[1]:
+                    # doubling keeps the full redraws rare
+                    self.ax_aif.set_xlim(0, 2 * tir[-1])
+                    rescaled = True
+
+        if rescaled:
+            # draw_event recaptures the background and draws the lines
+            self.canvas.draw()
+        elif self.background is not None:
+            self.canvas.restore_region(self.background)
+            self._draw_lines()
+            self.canvas.blit(self.fig.bbox)
+
+        self._after = self.root.after(int(1000 / self.fps), self.update)
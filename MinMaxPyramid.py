@@ -0,0 +1,190 @@
+import numpy as np
+
+
+class _Column:
+    """
+    Minimal growable float64 array (capacity doubles as it fills)
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.buf = np.zeros(capacity)
+        self.length = 0
+
+    def extend(self, values: np.ndarray):
+        end = self.length + len(values)
+        if end > len(self.buf):
+            buf = np.zeros(max(2 * len(self.buf), end))
+            buf[:self.length] = self.buf[:self.length]
+            self.buf = buf
+        self.buf[self.length:end] = values
+        self.length = end
+
+    def view(self) -> np.ndarray:
+        return self.buf[:self.length]
+
+
+class MinMaxPyramid:
+    """
+    Multi-resolution min/max envelope of a growing signal.
+
+    Level k (k >= 1) stores the min and max of every block of factor**k raw
+    samples and is built from level k-1, so update() only touches new samples.
+    query() picks the coarsest level that still gives about max_points blocks
+    for the requested range, so plotting costs the same whether the range
+    covers ten seconds or an hour.
+    """
+
+    def __init__(self, source, factor: int = 8):
+        """
+        Constructor for MinMaxPyramid
+
+        Args:
+            source (ndarray or callable): the raw signal, or a function returning
+                a view of it (e.g. lambda: store['IRminus']) for growing data
+            factor (int, optional): samples per block between levels. Defaults to 8.
+        """
+        self.source = source
+        self.factor = factor
+        self.clear()
+
+    def clear(self):
+        """
+        Forgets all levels, e.g. when the underlying store is cleared
+        """
+        self.n = 0  # raw samples included so far
+        self.levels = []  # [(mins, maxs)] for levels 1, 2, ...
+        self.update()
+
+    def raw(self) -> np.ndarray:
+        return self.source() if callable(self.source) else self.source
+
+    def update(self):
+        """
+        Adds any raw samples that arrived since the last call
+        """
+        raw = self.raw()
+        n = len(raw) - len(raw) % self.factor
+        if n <= self.n:
+            return
+        block = np.asarray(raw[self.n:n]).reshape(-1, self.factor)
+        mins, maxs = block.min(axis=1), block.max(axis=1)
+        self.n = n
+
+        level = 0
+        while len(mins):
+            if level == len(self.levels):
+                self.levels.append((_Column(), _Column()))
+            lmin, lmax = self.levels[level]
+            done = lmin.length - lmin.length % self.factor
+            lmin.extend(mins)
+            lmax.extend(maxs)
+
+            # the next level is built from the newly completed blocks only
+            end = lmin.length - lmin.length % self.factor
+            if end - done == 0:
+                break
+            mins = lmin.view()[done:end].reshape(-1, self.factor).min(axis=1)
+            maxs = lmax.view()[done:end].reshape(-1, self.factor).max(axis=1)
+            level += 1
+
+    def query(self, start: int, stop: int, max_points: int = 2000) -> tuple:
+        """Returns an envelope of raw[start:stop] with about max_points blocks
+
+        Args:
+            start (int): first raw sample
+            stop (int): one past the last raw sample
+            max_points (int, optional): target number of blocks. Defaults to 2000.
+
+        Returns:
+            tuple: (idx, y) raw sample indices and values to plot as one line;
+                decimated blocks contribute their min and max
+        """
+        raw = self.raw()
+        start = max(0, int(start))
+        stop = min(len(raw), int(stop))
+        if stop <= start:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        level = 0
+        while (level < len(self.levels) and
+               (stop - start) / self.factor ** level > max_points):
+            level += 1
+        if level == 0:
+            return np.arange(start, stop), np.asarray(raw[start:stop])
+
+        size = self.factor ** level
+        lmin, lmax = (c.view() for c in self.levels[level - 1])
+        b0 = start // size
+        b1 = min(-(-stop // size), len(lmin))
+
+        # each block is drawn as a vertical stroke from its min to its max
+        idx = np.repeat(np.arange(b0, b1) * size + size // 2, 2)
+        y = np.empty(2 * (b1 - b0))
+        y[0::2] = lmin[b0:b1]
+        y[1::2] = lmax[b0:b1]
+
+        # samples after the last complete block come straight from the raw data
+        tail = max(b1 * size, start)
+        if tail < stop:
+            idx = np.concatenate((idx, np.arange(tail, stop)))
+            y = np.concatenate((y, raw[tail:stop]))
+        return idx, y
+
+
+class EnvelopePlot:
+    """
+    Line on a matplotlib axes drawn from a MinMaxPyramid. When the x limits
+    change (zoom, pan) the line is refilled from the matching pyramid level.
+    """
+
+    def __init__(self, ax, x: np.ndarray, pyramid: MinMaxPyramid,
+                 max_points: int = 2000, **kwargs):
+        """
+        Constructor for EnvelopePlot
+
+        Args:
+            ax (Axes): axes to draw in
+            x (ndarray): monotonic x values for every raw sample
+            pyramid (MinMaxPyramid): envelope of the y values
+            max_points (int, optional): target number of blocks. Defaults to 2000.
+            **kwargs: passed on to ax.plot
+        """
+        self.ax = ax
+        self.x = x
+        self.pyramid = pyramid
+        self.max_points = max_points
+
+        (self.line,) = ax.plot([], [], **kwargs)
+        self.refresh(0, len(x))
+        ax.update_datalim(np.column_stack((self.line.get_xdata(),
+                                           self.line.get_ydata())))
+        ax.autoscale_view()
+        ax.callbacks.connect('xlim_changed', self._on_xlim)
+
+    def refresh(self, start: int, stop: int):
+        idx, y = self.pyramid.query(start, stop, self.max_points)
+        self.line.set_data(self.x[idx], y)
+
+    def _on_xlim(self, ax):
+        lo, hi = ax.get_xlim()
+        start = np.searchsorted(self.x, lo) - 1
+        stop = np.searchsorted(self.x, hi) + 1
+        self.refresh(start, stop)
+
+
+def plotenvelope(ax, x, y, max_points: int = 2000, **kwargs) -> EnvelopePlot:
+    """Plots y against x through a min/max pyramid built from the whole array
+
+    Args:
+        ax (Axes): axes to draw in
+        x (ndarray): monotonic x values
+        y (ndarray): y values
+        max_points (int, optional): target number of blocks. Defaults to 2000.
+        **kwargs: passed on to ax.plot
+
+    Returns:
+        EnvelopePlot: the plotted envelope
+    """
+    x = np.asarray(x).reshape(-1)
+    y = np.asarray(y).reshape(-1)
+    return EnvelopePlot(ax, x, MinMaxPyramid(y), max_points, **kwargs)
@@ -0,0 +1,316 @@
+"""
+Write-ahead journal for recordings in progress.
+
+While RecordingWriter streams a _Volts recording it also appends every block
+to <recording>.journal, flushed before the recording itself so the journal
+never holds less than the file, and fsynced about once a second, so a crash,
+power cut or killed process loses at most the last second of samples. A
+normal Stop deletes the journal; one left behind is turned back into a valid
+_Volts recording by recover() on the next start.
+
+The writing process holds an exclusive OS lock on <recording>.journal.lock
+for as long as it writes, so recovery (from the GUI or a second acquire.py)
+skips journals whose writer is still alive; the OS drops the lock when the
+writer dies, however it ends.
+
+Layout (little-endian): a fixed 1024 byte header
+
+    magic       8s    b'DHPDJRN\\x00'
+    version     u2
+    ncols       u2
+    patient     64s   patient ID, utf-8, null padded
+    injection   64s   injection ID, utf-8, null padded
+    fields      ncols x 32s column names
+
+followed by records
+
+    seq         u4    0, 1, 2, ... in write order
+    nrows       u4
+    crc32       u4    of seq, nrows and the values
+    values      nrows x ncols f8, row major
+
+Recovery keeps every record up to the first truncated, corrupt or out of
+sequence one.
+"""
+
+import argparse
+import glob
+import os
+import struct
+import time
+import zlib
+import numpy as np
+from BinaryRecording import BinaryRecording, HEADER_SIZE as BIN_HEADER_SIZE
+
+MAGIC = b'DHPDJRN\x00'
+VERSION = 1
+HEADER_SIZE = 1024
+SUFFIX = '.journal'
+LOCK_SUFFIX = '.lock'
+_FIXED = struct.Struct('<8sHH64s64s')
+_NAME = struct.Struct('<32s')
+_RECORD = struct.Struct('<III')
+
+
+def _lock(filename: str):
+    """Takes an exclusive, non-blocking lock on a lock file
+
+    Args:
+        filename (str): lock file, created if missing
+
+    Returns:
+        file: the open lock file (closing it releases the lock), or None if
+            another process or handle holds the lock
+    """
+    f = open(filename, 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _encode(text: str, size: int) -> bytes:
+    return str(text).encode('utf-8')[:size]
+
+
+def _decode(raw: bytes) -> str:
+    return raw.rstrip(b'\x00').decode('utf-8')
+
+
+class RecordingJournal:
+    """
+    Append-only journal of the blocks written to one recording
+    """
+
+    def __init__(self, filename: str, fields: list, patient: str = '',
+                 injection: str = '', sync_s: float = 1.0):
+        """
+        Constructor for RecordingJournal
+
+        Args:
+            filename (str): path of the recording being written; the journal
+                is filename + '.journal'
+            fields (list): column names
+            patient (str, optional): patient ID. Defaults to ''.
+            injection (str, optional): injection ID. Defaults to ''.
+            sync_s (float, optional): minimum time between fsyncs. Defaults to 1.0.
+        """
+        if _FIXED.size + len(fields) * _NAME.size > HEADER_SIZE:
+            raise ValueError("Too many columns for the journal header")
+        self.filename = filename + SUFFIX
+        self._lockfile = _lock(self.filename + LOCK_SUFFIX)
+        if self._lockfile is None:
+            raise OSError("Recording is being written by another process: " + filename)
+        self._lockfile.truncate(0)
+        self._lockfile.write(str(os.getpid()))  # for people looking at the folder
+        self._lockfile.flush()
+        self.ncols = len(fields)
+        self.sync_s = sync_s
+        self.seq = 0
+        self._lastsync = time.monotonic()
+
+        header = _FIXED.pack(MAGIC, VERSION, self.ncols,
+                             _encode(patient, 64), _encode(injection, 64))
+        header += b''.join(_NAME.pack(_encode(f, 32)) for f in fields)
+        self._file = open(self.filename, 'wb')
+        self._file.write(header.ljust(HEADER_SIZE, b'\x00'))
+        self.sync(force=True)
+
+    def append(self, block: np.ndarray):
+        """Adds one record (buffered until the next sync)
+
+        Args:
+            block (ndarray): (n, ncols) values
+        """
+        values = np.ascontiguousarray(block, dtype='<f8').tobytes()
+        head = struct.pack('<II', self.seq, len(block))
+        self._file.write(_RECORD.pack(self.seq, len(block),
+                                      zlib.crc32(values, zlib.crc32(head))))
+        self._file.write(values)
+        self.seq += 1
+
+    def flush(self):
+        """
+        Hands the records to the OS, so they survive the process being killed
+        """
+        self._file.flush()
+
+    def sync(self, force: bool = False):
+        """Makes the records durable, at most once every sync_s seconds
+
+        Args:
+            force (bool, optional): sync now regardless of the interval.
+                Defaults to False.
+        """
+        now = time.monotonic()
+        if not force and now - self._lastsync < self.sync_s:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._lastsync = now
+
+    def close(self, remove: bool = True):
+        """Closes the journal
+
+        Args:
+            remove (bool, optional): delete it, because the recording it
+                protects is complete. Defaults to True.
+        """
+        self._file.close()
+        if remove:
+            os.remove(self.filename)
+        self._lockfile.close()
+        if remove:
+            os.remove(self.filename + LOCK_SUFFIX)
+
+
+def readjournal(filename: str) -> tuple:
+    """Reads the valid records of a journal
+
+    Args:
+        filename (str): path of the .journal file
+
+    Returns:
+        tuple: (fields, patient, injection, blocks, nbad) where blocks is the
+            list of (n, ncols) arrays and nbad is 1 if the journal ends in a
+            truncated or corrupt record
+    """
+    with open(filename, 'rb') as f:
+        raw = f.read()
+    if len(raw) < HEADER_SIZE or raw[:8] != MAGIC:
+        raise ValueError("Not a recording journal: " + filename)
+    _, version, ncols, patient, injection = _FIXED.unpack_from(raw, 0)
+    if version != VERSION:
+        raise ValueError("Unsupported journal version %d" % version)
+    fields = [_decode(_NAME.unpack_from(raw, _FIXED.size + i * _NAME.size)[0])
+              for i in range(ncols)]
+
+    blocks = []
+    pos = HEADER_SIZE
+    nbad = 0
+    while pos < len(raw):
+        if pos + _RECORD.size > len(raw):
+            nbad = 1
+            break
+        seq, nrows, crc = _RECORD.unpack_from(raw, pos)
+        end = pos + _RECORD.size + nrows * ncols * 8
+        values = raw[pos + _RECORD.size:end]
+        if (end > len(raw) or seq != len(blocks) or
+                zlib.crc32(values, zlib.crc32(struct.pack('<II', seq, nrows))) != crc):
+            nbad = 1
+            break
+        blocks.append(np.frombuffer(values, dtype='<f8').reshape(nrows, ncols))
+        pos = end
+    return fields, _decode(patient), _decode(injection), blocks, nbad
+
+
+def _readrecording(target: str, ncols: int) -> np.ndarray:
+    """Rows of an interrupted recording that made it to disk
+
+    Args:
+        target (str): _Volts.csv or _Volts.bin file
+        ncols (int): columns per row
+
+    Returns:
+        ndarray: (n, ncols) complete rows; a partly written last CSV line and
+            the unwritten chunk of a binary recording are left out
+    """
+    if not os.path.exists(target):
+        return np.empty((0, ncols))
+    if target.endswith('.bin'):
+        # the header's row count is only written at close, so count full chunks
+        recording = BinaryRecording(target)
+        chunk = len(recording.channels) * recording.chunk_rows * 8
+        nchunks = (os.path.getsize(target) - BIN_HEADER_SIZE) // chunk
+        if nchunks <= 0:
+            return np.empty((0, ncols))
+        chunks = np.fromfile(target, dtype='<f8', offset=BIN_HEADER_SIZE,
+                             count=nchunks * chunk // 8)
+        return chunks.reshape(nchunks, len(recording.channels), -1) \
+            .transpose(0, 2, 1).reshape(-1, len(recording.channels))
+    with open(target, 'r') as f:
+        text = f.read()
+    lines = text[:text.rfind('\n') + 1].splitlines()[3:]  # SaO2, HbO2, fields
+    rows = [line.split(',') for line in lines if line]
+    rows = [row for row in rows if len(row) == ncols]
+    return np.array(rows, dtype=np.float64).reshape(-1, ncols)
+
+
+def recover(filename: str) -> str:
+    """Rebuilds the recording from a journal left by an interrupted run
+
+    The recording is rewritten from the journal (SaO2 and HbO2 are unknown, so
+    the header holds 0 for both, as when they are left empty) and the journal
+    is deleted. A journal still locked by a running writer is left alone
+    (OSError). If the recording on disk already holds more rows than the
+    journal (its tail was damaged), those rows are kept instead, so recovery
+    never loses samples that reached the file.
+
+    Args:
+        filename (str): path of the .journal file
+
+    Returns:
+        str: path of the recovered recording
+    """
+    # imported here because RecordingWriter writes journals
+    from RecordingWriter import RecordingWriter
+
+    lockfile = _lock(filename + LOCK_SUFFIX)
+    if lockfile is None:
+        raise OSError("still being recorded")
+    try:
+        fields, patient, injection, blocks, nbad = readjournal(filename)
+        target = filename[:-len(SUFFIX)]
+        ondisk = _readrecording(target, len(fields))
+        if len(ondisk) > sum(len(block) for block in blocks):
+            blocks = [ondisk]
+
+        # the journal already holds the rows as written: no samples skipped and
+        # timestamps already relative
+        writer = RecordingWriter(target, fields, istart=0, patient=patient,
+                                 injection=injection, t0=0.0, journal=False)
+        for block in blocks:
+            writer.append(block)
+        writer.finalize('0', '0')
+        os.remove(filename)
+    finally:
+        lockfile.close()
+    os.remove(filename + LOCK_SUFFIX)
+
+    print("recovered", writer.rows_written, "rows to", target,
+          "(journal ended in a damaged record)" if nbad else "")
+    return target
+
+
+def recoverall(data_dir: str) -> list:
+    """Recovers every journal left under a data directory
+
+    Args:
+        data_dir (str): e.g. the Data folder
+
+    Returns:
+        list: paths of the recovered recordings
+    """
+    recovered = []
+    for filename in sorted(glob.glob(os.path.join(data_dir, '**', '*' + SUFFIX),
+                                     recursive=True)):
+        try:
+            recovered.append(recover(filename))
+        except (OSError, ValueError) as e:
+            print("could not recover", filename, ":", e)
+    return recovered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recover interrupted recordings")
+    parser.add_argument('data_dir', nargs='?', default='Data')
+    args = parser.parse_args()
+    print(len(recoverall(args.data_dir)), "recording(s) recovered")
@@ -0,0 +1,197 @@
+import csv
+import os
+import queue
+import threading
+import time
+import numpy as np
+from BinaryRecording import BinaryRecordingWriter
+from RecordingJournal import RecordingJournal
+
+
+class RecordingWriter(threading.Thread):
+    """
+    Appends a _Volts.csv recording to disk while acquisition is running.
+
+    Blocks of samples are queued by the GUI thread and written by this thread
+    whenever flush_rows samples are pending or flush_s seconds have passed, so
+    a crash only loses the last few seconds and Stop only has to write what is
+    left in the queue. The writer holds no more than that queue in memory; the
+    acquisition's SampleStore still keeps the whole run (see Acquisition).
+    SaO2 and HbO2 are not known until Stop, so their header rows are written
+    as fixed-width placeholders and overwritten in place by finalize().
+
+    Filenames ending in '.bin' are written in the binary recording format
+    instead (see BinaryRecording), with SaO2 and HbO2 stored in its header.
+
+    Every written block also goes to a write-ahead journal, flushed before the
+    recording on every write, fsynced once a second and deleted by finalize(),
+    so an interrupted recording can be rebuilt (see RecordingJournal).
+    """
+
+    HEADER_WIDTH = 24  # characters reserved for the SaO2 and HbO2 header rows
+    ISTART = 5  # samples dropped at the start of every recording
+
+    def __init__(self, filename: str, fields: list, istart: int = ISTART,
+                 flush_s: float = 1.0, flush_rows: int = 5000, patient: str = '',
+                 injection: str = '', t0: float = None, journal: bool = True):
+        """
+        Constructor for RecordingWriter
+
+        Args:
+            filename (str): path of the _Volts.csv file to create
+            fields (list): column names for the third header row
+            istart (int, optional): samples dropped at the start of the recording;
+                timestamps are written relative to this sample. Defaults to ISTART.
+            flush_s (float, optional): maximum time between writes. Defaults to 1.0.
+            flush_rows (int, optional): pending samples that force a write. Defaults to 5000.
+            patient (str, optional): patient ID for binary recordings. Defaults to ''.
+            injection (str, optional): injection ID for binary recordings. Defaults to ''.
+            t0 (float, optional): host time the timestamps are written relative
+                to, shared when several probes record together. Defaults to
+                the timestamp of sample istart.
+            journal (bool, optional): keep a crash-recovery journal. Defaults to True.
+        """
+        super().__init__(daemon=True)
+        self.filename = filename
+        self.istart = istart
+        self.flush_s = flush_s
+        self.flush_rows = flush_rows
+
+        self.rows_written = 0
+        self._skip = istart
+        self._t0 = t0
+        self._tfirst = None
+        self._tlast = 0
+        self._queue = queue.SimpleQueue()
+        self._pending = 0  # rows queued, updated by both threads under _lock
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+        self._journal = None
+        if journal:
+            self._journal = RecordingJournal(filename, fields, patient, injection)
+
+        self.binary = filename.endswith('.bin')
+        if self.binary:
+            self._bin = BinaryRecordingWriter(filename, fields, patient, injection)
+            return
+
+        self._file = open(filename, 'w', newline='')
+        self._wc = csv.writer(self._file)
+        # placeholders for SaO2 and HbO2, filled in by finalize()
+        self._wc.writerow(['0'.ljust(self.HEADER_WIDTH)])
+        self._wc.writerow(['0'.ljust(self.HEADER_WIDTH)])
+        self._wc.writerow(fields)
+        self._file.flush()
+
+    def append(self, block: np.ndarray):
+        """Queues samples for writing. Called from the acquisition side.
+
+        Args:
+            block (ndarray): (n, 7) RED, RED ambient, IR, IR ambient,
+                RED - RED ambient, IR - IR ambient, timestamp
+        """
+        self._queue.put(block)
+        with self._lock:
+            self._pending += len(block)
+
+    def run(self):
+        """
+        Writes queued samples on a time/size cadence until finalize() is called
+        """
+        last = time.monotonic()
+        while not self._stop_event.wait(0.05):
+            if (self._pending >= self.flush_rows or
+                    time.monotonic() - last >= self.flush_s):
+                self._write_pending()
+                last = time.monotonic()
+        self._write_pending()
+
+    def _write_pending(self):
+        """
+        Writes everything in the queue and flushes the file
+        """
+        wrote = False
+        while True:
+            try:
+                block = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._pending -= len(block)
+
+            # drop the first istart samples, as the recording always has
+            if self._skip:
+                n = min(self._skip, len(block))
+                block = block[n:]
+                self._skip -= n
+            if len(block) == 0:
+                continue
+            if self._t0 is None:
+                self._t0 = block[0, 6]
+
+            block = block.copy()
+            block[:, 6] -= self._t0
+            if self._journal is not None:
+                self._journal.append(block)
+            if self.binary:
+                self._bin.append(block)
+            else:
+                self._wc.writerows(block.tolist())
+            self.rows_written += len(block)
+            if self._tfirst is None:
+                self._tfirst = block[0, 6]
+            self._tlast = block[-1, 6]
+            wrote = True
+        if wrote:
+            # journal first, so the file on disk is never ahead of it
+            if self._journal is not None:
+                self._journal.flush()
+            (self._bin if self.binary else self._file).flush()
+            if self._journal is not None:
+                self._journal.sync()
+
+    def finalize(self, SaO2: str, HbO2: str, fs: float = None):
+        """Writes the remaining samples, fills in the header and closes the file
+
+        Args:
+            SaO2 (str): oxygen saturation entered by the user
+            HbO2 (str): total hemoglobin entered by the user
+            fs (float, optional): measured sample rate for the binary header.
+                Defaults to an estimate from the first and last timestamps.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        else:
+            self._write_pending()
+
+        if self.binary:
+            if not fs:
+                fs = 0
+                if self.rows_written > 1 and self._tlast > self._tfirst:
+                    fs = (self.rows_written - 1) / (self._tlast - self._tfirst)
+            self._bin.close(float(SaO2), float(HbO2), fs)
+            self._closejournal()
+            return
+
+        # rewrite the placeholder rows in place without touching the data
+        self._file.seek(0)
+        for value in (SaO2, HbO2):
+            value = str(value)
+            if len(value) > self.HEADER_WIDTH:
+                print("header value too long, truncated:", value)
+                value = value[:self.HEADER_WIDTH]
+            self._file.write(value.ljust(self.HEADER_WIDTH) + '\r\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._closejournal()
+
+    def _closejournal(self):
+        """
+        Deletes the journal once the recording on disk is complete
+        """
+        if self._journal is not None:
+            self._journal.close(remove=True)
+            self._journal = None
@@ -0,0 +1,76 @@
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Preallocated single-producer/single-consumer ring buffer for sample rows.
+
+    The producer (serial reader thread) only ever advances self.head and the
+    consumer (GUI thread) only ever advances self.tail, so no lock is needed:
+    each counter has a single writer and rows are copied in before the head is
+    published.
+    """
+
+    def __init__(self, capacity: int, width: int, dtype=np.float64):
+        """
+        Constructor for RingBuffer
+        """
+        self.capacity = capacity
+        self.width = width
+        self.buf = np.zeros((capacity, width), dtype=dtype)
+
+        self.head = 0  # total rows ever written (producer only)
+        self.tail = 0  # total rows ever read (consumer only)
+        self.overflows = 0  # rows dropped because the consumer fell behind
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def push(self, rows: np.ndarray) -> int:
+        """Copies rows into the buffer. Called from the producer thread only.
+
+        Args:
+            rows (ndarray): (n, width) array of rows to add
+
+        Returns:
+            int: number of rows stored (rows that do not fit are dropped)
+        """
+        n = len(rows)
+        free = self.capacity - (self.head - self.tail)
+        if n > free:
+            # The consumer owns the tail, so newest rows are dropped and counted
+            self.overflows += n - free
+            rows = rows[:free]
+            n = free
+        if n == 0:
+            return 0
+
+        start = self.head % self.capacity
+        first = min(n, self.capacity - start)
+        self.buf[start:start + first] = rows[:first]
+        self.buf[:n - first] = rows[first:]
+
+        # publish only after the rows have been copied in
+        self.head += n
+        return n
+
+    def pop(self, max_rows: int = None) -> np.ndarray:
+        """Removes and returns the oldest rows. Called from the consumer thread only.
+
+        Args:
+            max_rows (int, optional): upper bound on rows returned. Defaults to all.
+
+        Returns:
+            ndarray: (n, width) copy of the rows read
+        """
+        n = self.head - self.tail
+        if max_rows is not None:
+            n = min(n, max_rows)
+
+        start = self.tail % self.capacity
+        first = min(n, self.capacity - start)
+        out = np.concatenate((self.buf[start:start + first],
+                              self.buf[:n - first]))
+
+        self.tail += n
+        return out
@@ -0,0 +1,165 @@
+import numpy as np
+
+
+class SampleClock:
+    """
+    Running linear model of host time against the device sample counter.
+
+    Every chunk read from the port gives one observation: the counter of the
+    newest sample and the host time the read returned. A weighted least
+    squares line host_time = t0 + (counter - c0) / fs is kept with exponential
+    forgetting (time constant window_s), so per-sample timestamps come from
+    the model instead of from read scheduling jitter, and fs tracks slow
+    drift of the device oscillator.
+
+    Refitting after each chunk can move the line back a little, so a chunk
+    never starts before the previous one ended: its samples are kept at
+    least one model period after the last timestamp issued.
+
+    The fit is only meaningful for a real device counter; a reader without
+    one simply never calls update(), and timestamps are then spaced at the
+    nominal rate back from the read time.
+    """
+
+    def __init__(self, nominal_fs: float = None, window_s: float = 300):
+        """
+        Constructor for SampleClock
+
+        Args:
+            nominal_fs (float, optional): expected device rate in Hz; used
+                before the first fit and as the reference for drift. Defaults to None.
+            window_s (float, optional): forgetting time constant. Defaults to 300.
+        """
+        self.nominal_fs = nominal_fs
+        self.window_s = window_s
+        self.reset()
+
+    def reset(self):
+        self.c0 = None  # counter and host time the sums are centred on
+        self.h0 = None
+        self.npoints = 0
+        self._last = None  # for unwrapping the 32-bit counter
+        self._wrap = 0
+        self._tlast = None
+        self._issued = None  # counter and timestamp of the last sample stamped
+        self._s = np.zeros(6)  # S, Sx, Sy, Sxx, Sxy, Syy
+
+    def unwrap(self, counters: np.ndarray) -> np.ndarray:
+        """Removes 32-bit wrap-arounds from device sample counters
+
+        Args:
+            counters (ndarray): counters in arrival order
+
+        Returns:
+            ndarray: monotonic int64 counters
+        """
+        counters = np.asarray(counters, dtype=np.int64)
+        if len(counters) == 0:
+            return counters
+        prev = counters[0] if self._last is None else self._last
+        steps = np.diff(np.concatenate(([prev], counters)))
+        wraps = self._wrap + np.cumsum(steps < -2 ** 31) * 2 ** 32
+        self._wrap = wraps[-1]
+        self._last = counters[-1]
+        return counters + wraps
+
+    def update(self, counter: int, host_time: float):
+        """Adds one observation (newest sample counter, host time of the read)
+
+        Args:
+            counter (int): unwrapped counter of the newest sample
+            host_time (float): time.perf_counter() when the read returned
+        """
+        if self.c0 is None:
+            self.c0 = counter
+            self.h0 = host_time
+        if self._tlast is not None:
+            self._s *= np.exp(-(host_time - self._tlast) / self.window_s)
+        self._tlast = host_time
+
+        x = float(counter - self.c0)
+        y = host_time - self.h0
+        self._s += (1, x, y, x * x, x * y, y * y)
+        self.npoints += 1
+
+    def _fit(self) -> tuple:
+        """
+        Returns (intercept, slope) of host time against counter, or None
+        """
+        S, Sx, Sy, Sxx, Sxy, _ = self._s
+        if self.npoints < 2:
+            return None
+        var = Sxx - Sx * Sx / S
+        if var <= 0:
+            return None
+        slope = (Sxy - Sx * Sy / S) / var
+        return (Sy - slope * Sx) / S, slope
+
+    def timestamps(self, counters: np.ndarray, host_time: float) -> np.ndarray:
+        """Model timestamps for a chunk of samples
+
+        Args:
+            counters (ndarray): unwrapped counters of the chunk
+            host_time (float): time the chunk was read (used until a fit exists)
+
+        Returns:
+            ndarray: increasing host-time timestamps, one per sample
+        """
+        x = np.asarray(counters, dtype=np.float64)
+        if len(x) == 0:
+            return x
+        fit = self._fit()
+        period = 1 / self.nominal_fs if self.nominal_fs else 0.0
+        if fit is not None and fit[1] > 0:
+            period = fit[1]
+            ts = self.h0 + fit[0] + fit[1] * (x - self.c0)
+        else:
+            ts = host_time - (x[-1] - x) * period
+
+        # continue from the previous chunk if the model moved back
+        if self._issued is not None:
+            ts = np.maximum(ts, self._issued[1] + (x - self._issued[0]) * period)
+        ts = np.maximum.accumulate(ts)
+        self._issued = (x[-1], ts[-1])
+        return ts
+
+    @property
+    def fs(self) -> float:
+        """
+        Measured sample rate in Hz (nominal rate until a fit exists)
+        """
+        fit = self._fit()
+        if fit is None or fit[1] <= 0:
+            return self.nominal_fs
+        return float(1 / fit[1])
+
+    @property
+    def drift_ppm(self) -> float:
+        """
+        Deviation of the measured rate from the nominal rate, in ppm
+        """
+        fs = self.fs
+        if not self.nominal_fs or self._fit() is None:
+            return None
+        return float((fs / self.nominal_fs - 1) * 1e6)
+
+    @property
+    def jitter(self) -> float:
+        """
+        Standard deviation (s) of read times around the model
+        """
+        S, Sx, Sy, Sxx, Sxy, Syy = self._s
+        fit = self._fit()
+        if fit is None:
+            return None
+        a, b = fit
+        sse = Syy - 2 * a * Sy - 2 * b * Sxy + a * a * S + 2 * a * b * Sx + b * b * Sxx
+        return float(np.sqrt(max(sse, 0) / S))
+
+    def summary(self) -> dict:
+        """
+        Clock figures stored with the recording
+        """
+        fs = self.fs if self._fit() is not None else None  # measured only
+        return {'fs': fs, 'drift_ppm': self.drift_ppm,
+                'jitter_s': self.jitter, 'observations': self.npoints}
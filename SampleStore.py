@@ -0,0 +1,100 @@
+import numpy as np
+
+
+class SampleStore:
+    """
+    Growable columnar store for acquired samples.
+
+    Each channel is one preallocated NumPy column plus an int64 sample index.
+    Capacity grows in whole chunks and at least doubles, so appends are O(1)
+    amortized, and reading a channel returns a zero-copy view of the filled part.
+    """
+
+    def __init__(self, channels: list, dtype=np.float64, chunk: int = 2 ** 16,
+                 float64_channels: tuple = ('ts',)):
+        """
+        Constructor for SampleStore
+
+        Args:
+            channels (list): channel names, in the column order used by append
+            dtype (optional): storage type for the channels. Defaults to np.float64.
+            chunk (int, optional): allocation granularity in samples. Defaults to 2**16.
+            float64_channels (tuple, optional): channels always kept as float64
+                (timestamps lose precision in float32). Defaults to ('ts',).
+        """
+        self.channels = list(channels)
+        self.chunk = chunk
+        self.length = 0
+
+        self._index = np.zeros(chunk, dtype=np.int64)
+        self._cols = {}
+        for name in self.channels:
+            coltype = np.float64 if name in float64_channels else dtype
+            self._cols[name] = np.zeros(chunk, dtype=coltype)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """
+        Returns a zero-copy view of the filled part of a channel
+        """
+        return self._cols[name][:self.length]
+
+    @property
+    def index(self) -> np.ndarray:
+        """
+        Zero-copy view of the sample numbers (1, 2, 3 ...)
+        """
+        return self._index[:self.length]
+
+    @property
+    def capacity(self) -> int:
+        return len(self._index)
+
+    def _grow(self, needed: int):
+        """Reallocates every column so that at least needed samples fit
+
+        Args:
+            needed (int): minimum capacity required
+        """
+        capacity = max(2 * self.capacity, needed)
+        capacity = -(-capacity // self.chunk) * self.chunk  # round up to a chunk
+
+        index = np.zeros(capacity, dtype=np.int64)
+        index[:self.length] = self._index[:self.length]
+        self._index = index
+        for name, col in self._cols.items():
+            new = np.zeros(capacity, dtype=col.dtype)
+            new[:self.length] = col[:self.length]
+            self._cols[name] = new
+
+    def append(self, values: np.ndarray) -> int:
+        """Appends a block of samples
+
+        Args:
+            values (ndarray): (n, len(channels)) array in channel order
+
+        Returns:
+            int: number of samples appended
+        """
+        n = len(values)
+        if n == 0:
+            return 0
+        end = self.length + n
+        if end > self.capacity:
+            self._grow(end)
+
+        self._index[self.length:end] = np.arange(self.length + 1, end + 1)
+        for i, name in enumerate(self.channels):
+            self._cols[name][self.length:end] = values[:, i]
+
+        # length is updated last so readers never see unfilled samples
+        self.length = end
+        return n
+
+    def clear(self):
+        """
+        Empties the store, keeping the allocated memory for the next run
+        """
+        self.length = 0
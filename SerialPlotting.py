@@ -1,16 +1,20 @@
 from tkinter.constants import FLAT, GROOVE, RAISED, RIDGE, SOLID, SUNKEN
 import matplotlib.pyplot as plt
-import csv
 from datetime import datetime
 import tkinter as tk
 from tkinter import PhotoImage, ttk
 from PIL import Image, ImageTk
-import serial
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import os
 import time
-import serial.tools.list_ports   # import pyserial module
+from ComDiscovery import ComDiscovery
+from RecordingJournal import recoverall
+from Acquisition import Acquisition, portlabel, recordingname
+from LiveView import LiveView
+from SignalQuality import SignalQuality
+from StreamingAIF import StreamingAIF
+from MinMaxPyramid import EnvelopePlot
 from o_loadAIF import o_loadAIF
 from GUI_Vars import GUI_Vars
 
@@ -22,17 +26,9 @@ class SerialPlotting:
         # self.fileName = "Finger Probe Voltage_test.csv"
         self.COMt = None
         self.com = None
+        self.ports = []  # every selected port, one probe each
         self.now = None
         self.dt_string = None
-        # Variables to store incoming data
-        self.xs = []  # store sample numbers here (n)
-        self.ys = []  # store RED temp values here
-        self.y2s = []  # Store IR temp values here
-        self.y3s = []  # Store RED ambient values here
-        self.y4s = []  # Store IR ambient values here
-        self.y5s = []  # Store RED raw - RED ambient values here
-        self.y6s = []  # Store IR raw - IR ambient values here
-        self.ts = []  # Stores timestamp values here
         self.running = False
         self.prevtrue = False
         self.cfn = False
@@ -40,9 +36,15 @@ class SerialPlotting:
         self.msg = None
         self.progressbar = None
         self.SampleCount = 0
-        # setting up csv file for arduino data
-        self.fields = ['Ch : RED', 'Ch : RED AMBIENT', 'Ch : IR',
-                       'Ch: IR AMBIENT', 'Ch : RED - RED AMBIENT', 'Ch : IR - IR AMBIENT', 'Timestamp']
+        # one reader/store/writer pipeline per probe; the first one is shown
+        # in the live view and used for the ICG curve
+        self.acquisitions = []
+        self.prefix = None  # absolute path of the recording, without suffix
+        self.recording_format = 'csv'  # 'csv' or 'bin' (see BinaryRecording)
+        self.poll_ms = 20  # how often the GUI collects samples from the reader
+        # AIF computed while recording (see StreamingAIF), ready at Stop
+        self.streaming = None
+        self.streamed = None  # (hr, confidence, t, Ca) for ICG_Curve
         # Sets current directory for file management
         self.current_dir = os.getcwd()
 
@@ -53,52 +55,73 @@ class SerialPlotting:
         self.root = tk.Tk()
 
     def getcom(self):
-        self.com = self.COMt.get()
-        print("com port =", self.com)
+        # several probes can be recorded at once: "COM3, COM4"
+        self.ports = [p.strip() for p in self.COMt.get().split(',') if p.strip()]
+        self.com = self.ports[0] if self.ports else None
+        print("com ports =", self.ports)
 
     def ComSelect(self, comframe):
         """
-        Creates combo box selection of com port
+        Creates combo box selection of com port (comma-separated for several probes)
         """
         self.COMt = tk.StringVar()
-        combobox = ttk.Combobox(comframe, textvariable=self.COMt, width=16)
-        combobox.grid(row=1, column=0)
-        combobox.config(values=('COM1', 'COM2', 'COM3', 'COM4',
-                        'COM5', 'COM6', 'COM7', 'COM8', 'COM9', 'COM10'))
-
-        # Query to find & select correct com port
-        comPorts = list(serial.tools.list_ports.comports(include_links=False))
-        for p in comPorts:
-            if 'USB Serial Device' in p.description:
-                # Connection to port
-                s = serial.Serial(p.device)
-                COM = s.port
-                print('COM = ', COM)
-        try:
-            self.COMt.set(COM)  # sets correct COM port
-        except:
-            pass
+        self.combobox = ttk.Combobox(comframe, textvariable=self.COMt, width=16)
+        self.combobox.grid(row=1, column=0)
+
+        # ports are found from USB metadata in the background, without opening
+        # them; until the first scan the last probes' ports are preselected
+        self.discovery = ComDiscovery(os.path.join(self.current_dir, 'Data',
+                                                   'probe_port.json'))
+        self.COMt.set(', '.join(probe['port'] for probe in self.discovery.known))
+        self.discovery.start()
+        self.shownports = None
+        self.refreshcoms()
+
+    def refreshcoms(self):
+        """
+        Updates the combo box from the latest background port scan
+        """
+        ports = self.discovery.ports
+        if ports != self.shownports:
+            self.shownports = ports
+            self.combobox.config(values=ports)
+            selected = [p.strip() for p in self.COMt.get().split(',')]
+            if not all(p in ports for p in selected):
+                # every remembered probe that is plugged in, else the best guess
+                found = self.discovery.remembered or [self.discovery.probe]
+                if found[0]:
+                    self.COMt.set(', '.join(found))  # sets correct COM ports
+                    print('COM = ', self.COMt.get())
+        self.root.after(1000, self.refreshcoms)
 
     def openserial(self):
-        # Intialize Serial Port
-        self.getcom()  # sets COM port to whatever is selected in the combobox
-
+        # Intialize Serial Ports
+        self.getcom()  # sets COM ports to whatever is selected in the combobox
+        if not self.ports:
+            self.acquisitions = []
+            self.show_error("Select a COM port first")
+            return
+
+        # sets baud rate; each reader thread owns its port from here on
+        label = len(self.ports) > 1
+        self.acquisitions = [Acquisition(port, 230400,
+                                         label=portlabel(port) if label else '')
+                             for port in self.ports]
         try:
-            # sets baud rate
-            # self.arduino = serial.Serial(self.com, 450000)
-            self.arduino = serial.Serial(self.com, 230400)
+            for acq in self.acquisitions:
+                acq.open()
+            self.discovery.remember([acq.port for acq in self.acquisitions])
         except:  # NameError:  # exception arduino not defined
+            self.closeserial()
+            self.acquisitions = []
             self.show_error("Wrong com port selected")
 
-        # Check Serial Port is Open
-        if self.arduino.is_open == True:
-            print("\nAll right, serial port now open. Configuration:\n")
-            print(self.arduino, "\n")  # print serial parameters
-
-        # display the data to the terminal
-        getData = str(self.arduino.readline())
-        data = getData[0:][:-2]
-        print(data)
+    def closeserial(self):
+        """
+        Stops the reader threads, which close the serial ports
+        """
+        for acq in self.acquisitions:
+            acq.close()
 
     def CreateDateTime(self):
         # Create date and time variable dd/mm/YY H: M: S
@@ -114,61 +137,38 @@ class SerialPlotting:
         Clears data to enable multiple runs using start & preview buttons
         """
         self.SampleCount = 0
-        self.xs.clear()
-        self.ys.clear()
-        self.y2s.clear()
-        self.y3s.clear()
-        self.y4s.clear()
-        self.y5s.clear()
-        self.y6s.clear()
-        self.ts.clear()
+        for acq in self.acquisitions:
+            acq.clear()
 
-    def writedata(self, redraw, irraw, redtemp, irtemp, redtot, irtot, ts):
+    def createdatafile(self):
         """
-        Writes data to CSV
+        Creates the data folder and starts streaming each probe's recording
         """
         # Sets data directory for data storage
-        dat_dir = self.current_dir + "/Data"
+        dat_dir = os.path.join(self.current_dir, "Data")
 
         # Creates Folder for Volts and ICG
         path = os.path.join(dat_dir, self.folderName)
-        new_dir = os.mkdir(path)
+        os.mkdir(path)
         print(path)
 
-        print(dat_dir)
-        os.chdir(path)
-        print(os.getcwd)
-
-        print(self.fileName)
-
-        with open(self.fileName, 'w', newline='') as f:
-            # creating a csv writer object
-            wc = csv.writer(f)
+        # absolute paths, so nothing depends on the working directory
+        self.prefix = os.path.join(path, self.folderName)
 
-            # Write Field Names
-            # wc.writerow(self.dt_string)
-            wc.writerow([self.SaO2])
-            # wc.writerow(['Volts'])
-            wc.writerow([self.HbO2])
-            wc.writerow(self.fields)
-            print("Created File")
+        # probes recorded together share the same zero time
+        t0 = time.perf_counter() if len(self.acquisitions) > 1 else None
 
-        with open(self.fileName, 'a', newline='') as f:
-            # creating a csv writer object
-            wc = csv.writer(f)
+        # samples are appended by a writer thread per probe while collecting
+        for acq in self.acquisitions:
+            acq.record(self.prefix, self.patID, self.injID,
+                       self.recording_format, t0)
 
-            # tdelta = []
-            istart = 5
-
-            for i in range(istart, len(self.ys)):
-                delta = ts[i]-ts[istart]
-                # tdelta = float(delta.total_seconds())
-                tdelta = delta
-                # print(tdelta)
-
-                irow = [redraw[i], irraw[i], redtemp[i],
-                        irtemp[i], redtot[i], irtot[i], tdelta]
-                wc.writerow(irow)
+    def writedata(self):
+        """
+        Finishes writing the recordings and fills in the SaO2 and HbO2 header rows
+        """
+        for acq in self.acquisitions:
+            acq.finish(self.SaO2, self.HbO2)
 
     def stop_preview(self):
         end = time.time()
@@ -178,98 +178,82 @@ class SerialPlotting:
         self.new_message("")
 
         # self.root.quit()
-        self.prevtrue = False
-        self.arduino.close()
+        self.endpreview()
+        self.closeserial()
         print("Time elapsed: ", end - self.start)
         self.plotdata()
 
-    def dataread(self):
+    def endpreview(self):
         """
-        This function reads and stores the SPI data
+        Removes the live preview and its signal-quality readout (the port stays open)
         """
-        if self.running:
-            # Aquire and parse data from serial port
-            line = self.arduino.readline()[:-2]
-            line_as_list = line.split(b',')
-            count = line_as_list[0]
-
-            try:
-                if len(line_as_list) != 4:  # Verifies that serial data is voltage values
-                    raise Exception
-                    # print("line as list = ", line_as_list)
-
-            except Exception:
-                print("skipped ", count)
-
-            else:
-                # i = int(line_as_list[0])
-                REDtemp = line_as_list[0]
-                IRtemp = line_as_list[1]
-                REDamb = line_as_list[2]
-                IRamb = line_as_list[3]
-                timestamp = time.perf_counter()
-                # timestamp = datetime.utcnow()
+        self.prevtrue = False
+        self.liveview.stop()
+        self.quality_label.grid_remove()
 
-                # print("timestamp = ", timestamp)
+    def showquality(self):
+        """
+        Updates the signal-quality readout a few times a second while previewing
+        """
+        if not self.prevtrue or not self.acquisitions:
+            return
+        metrics = self.quality.update(self.acquisitions[0].data)
+        self.quality_label.config(text=self.quality.text(metrics))
+        self.root.after(250, self.showquality)
 
-                REDtemp_as_list = REDtemp.split(b'\n')
-                IRtemp_as_list = IRtemp.split(b'\n')
-                REDamb_as_list = REDamb.split(b'\n')
-                IRamb_as_list = IRamb.split(b'\n')
+    def drainreader(self):
+        """
+        Moves the samples collected by the reader threads into the sample stores
+        """
+        for acq in self.acquisitions:
+            acq.drain()
+        if self.acquisitions:
+            self.SampleCount = len(self.acquisitions[0])
 
-                try:
-                    REDtemp_float = float(REDtemp_as_list[0])
-                    IRtemp_float = float(IRtemp_as_list[0])
-                    REDamb_float = float(REDamb_as_list[0])
-                    IRamb_float = float(IRamb_as_list[0])
-
-                    REDminus_float = REDtemp_float - REDamb_float
-                    IRminus_float = IRtemp_float - IRamb_float
-                except Exception as err:
-                    print(err)
-                else:
-
-                    # Add x and y to lists
-                    self.SampleCount += 1
-                    self.xs.append(self.SampleCount)
-                    self.ys.append(REDtemp_float)
-                    self.y2s.append(IRtemp_float)
-                    self.y3s.append(REDamb_float)
-                    self.y4s.append(IRamb_float)
-                    self.y5s.append(REDminus_float)
-                    self.y6s.append(IRminus_float)
-                    self.ts.append(timestamp)
-                    # print('Sample # = ', SampleCount, ', IR Raw = ',
-                    #   IRtemp_float, ', RED Raw = ', REDtemp_float)
-        if self.prevtrue:
-            # progressbar.step(1)
-            if self.SampleCount == 1500:
-                self.stop_preview()
-                # root.quit()
-                # prevtrue = False
+    def dataread(self):
+        """
+        Polls the reader thread for new samples while collection is running
+        """
+        if self.running:
+            self.drainreader()
+            if self.streaming is not None and self.acquisitions:
+                self.streaming.update(self.acquisitions[0].data)
 
-        self.root.update_idletasks()
-        self.root.after(1, self.dataread)
+        # GUI only polls the reader, so a slow tick no longer drops samples
+        if self.running:
+            self.root.update_idletasks()
+            self.root.after(self.poll_ms, self.dataread)
 
     def plotdata(self):
         """
         Plots the data after it has been collected for verification
         """
-        fig3, (ax1, ax2) = plt.subplots(nrows=2)
-
-        ax1.plot(self.xs[5:-1], self.y6s[5:-1], label="IR Ambient")
-        ax2.plot(self.xs[5:-1], self.y5s[5:-1],
-                 label="RED Ambient", color='darkred')
-
-        # Format plot
-        plt.xticks(rotation=45, ha='right')
-        plt.subplots_adjust(bottom=0.30)
-
-        ax1.set_ylabel('IR Raw - Ambient (V)')
-        ax2.set_ylabel('Red Raw - Ambient (V)')
-        plt.xlabel('Sample #')
-
-        plt.tight_layout()
+        self.envelopes = []
+        for acq in self.acquisitions:
+            fig3, (ax1, ax2) = plt.subplots(nrows=2)
+            if len(self.acquisitions) > 1:
+                fig3.suptitle(acq.port)
+
+            # drawn from the min/max pyramids, so long recordings plot (and zoom)
+            # at a fixed cost
+            x = acq.data.index
+            self.envelopes += [
+                EnvelopePlot(ax1, x, acq.pyramids['IRminus'], label="IR Ambient"),
+                EnvelopePlot(ax2, x, acq.pyramids['REDminus'],
+                             label="RED Ambient", color='darkred')]
+            if len(x) > 6:
+                ax1.set_xlim(x[5], x[-2])
+                ax2.set_xlim(x[5], x[-2])
+
+            # Format plot
+            plt.xticks(rotation=45, ha='right')
+            plt.subplots_adjust(bottom=0.30)
+
+            ax1.set_ylabel('IR Raw - Ambient (V)')
+            ax2.set_ylabel('Red Raw - Ambient (V)')
+            plt.xlabel('Sample #')
+
+            plt.tight_layout()
         plt.show()
 
     def createfilename(self, patID, injID):
@@ -280,21 +264,19 @@ class SerialPlotting:
         # f'{patID}_{injID}_{self.now.year}{self.now.month}{self.now.day}' +
         # f'_{self.now.hour}{self.now.minute}{self.now.second}.csv']
 
-        fn_string = [
-            f'{patID}_{injID}_{self.now.year}{self.now.month}{self.now.day}' +
-            f'_{self.now.hour}{self.now.minute}{self.now.second}']
-
-        # fileName = patID + "_" + injID + "_" + now.year + now.
+        # same layout as the headless recorder (acquire.py)
+        fn_string = recordingname(patID, injID, self.now)
         print("filename =", fn_string)
-        fn_string = ' '.join(map(str, fn_string))
 
-        self.fileName = fn_string + '_Volts' + '.csv'
+        self.fileName = fn_string + '_Volts' + '.' + self.recording_format
         self.folderName = fn_string
 
     def retrieve(self):
         self.CreateDateTime()
         patID = self.my_entry.get()
         injID = self.my_entry2.get()
+        self.patID = patID
+        self.injID = injID
         self.notetext = self.text.get('1.0', 'end - 1 chars')
         print(patID)
         print(injID)
@@ -313,7 +295,7 @@ class SerialPlotting:
             print('No notes added')
         else:
             print('Notes text file created')
-            Note_fn = self.folderName + '_Notes.txt'
+            Note_fn = self.prefix + '_Notes.txt'
             self.Note_file = open(Note_fn, "a")
             self.Note_file.writelines(self.notetext)
             self.Note_file.close()
@@ -390,10 +372,16 @@ class SerialPlotting:
         """
         Button to stop data collection & export collected data to CSV with timestamp
         """
+        if self.prevtrue:
+            self.stop_preview()
+            return
+
         self.new_message("Data Collection complete")
         self.progressbar.stop()
 
         self.running = False
+        self.closeserial()
+        self.liveview.stop()
 
         # pulls in the SaO2 and HbO2 from entry boxes (defaults to 0 for both)
         self.SaO2 = self.SaO2_ent.get()
@@ -406,12 +394,21 @@ class SerialPlotting:
         print(self.SaO2)
         print(self.HbO2)
 
-        self.writedata(self.ys, self.y3s, self.y2s, self.y4s, self.y5s,
-                       self.y6s, self.ts)
+        # the AIF was computed while recording; only the last beat is left
+        self.streamed = None
+        if self.streaming is not None:
+            try:
+                SaO2, tHb = float(self.SaO2), float(self.HbO2)
+            except ValueError:
+                SaO2, tHb = 0, 0
+            aif = self.streaming.finish(self.acquisitions[0].data, SaO2, tHb)
+            if aif is not None:
+                self.streamed = (self.streaming.hr, self.streaming.confidence) + aif
+            self.streaming = None
+
+        self.writedata()
         print("filename = ", self.fileName)
 
-        self.arduino.close()
-
         self.ICG_button["state"] = "normal"
         # print("you enabled it, great job!")
         self.start_button["state"] = "normal"
@@ -427,12 +424,19 @@ class SerialPlotting:
         """
         self.ICG_button["state"] = "disable"
         if self.fncreated:
+            # starting from the preview keeps its port (and reader) open
+            previewing = self.prevtrue and bool(self.acquisitions)
+            if previewing:
+                self.endpreview()
             self.cleardata()  # Clears data from previous collection
             self.progressbar.config(mode='indeterminate')
-            try:
-                self.openserial()
-            except:
-                print("Serial Already Open")
+            if not previewing:
+                try:
+                    self.openserial()
+                except:
+                    print("Serial Already Open")
+                if not self.acquisitions:
+                    return
             self.running = True
             self.progressbar.start()
 
@@ -442,31 +446,61 @@ class SerialPlotting:
                 self.show_message("Data Collection in Progress")
 
             self.retrieve()
+            try:
+                self.createdatafile()
+            except OSError as e:
+                # e.g. Start pressed twice with the same IDs: the folder exists
+                self.running = False
+                self.progressbar.stop()
+                self.new_message("")
+                self.closeserial()
+                for acq in self.acquisitions:
+                    acq.finish('0', '0')  # a writer may have started
+                self.acquisitions = []
+                self.show_error("Could not create the data folder:\n%s" % e)
+                return
             self.start_button["state"] = "disable"
             self.preview_button["state"] = "disable"
 
-            # Re-enters loop to read data from shield
-            self.dataread()
+            # Re-enters loop to read data from shield (already polling if
+            # the preview was running)
+            primary = self.acquisitions[0]
+            self.streaming = StreamingAIF(GUI_Vars(
+                self.root, self.fig, self.canvas, primary.filename(''), self.msg,
+                self.current_dir, 0, 0))
+            if not previewing:
+                self.dataread()
+            self.liveview.start(self.root, primary.data, primary.pyramids,
+                                self.streaming)
 
         else:
             self.show_error("Enter Patient ID and Injection ID First")
 
     def preview_data(self):
         """
-        Creates a preview of the Data
+        Streams a live preview with signal-quality metrics until Start or Stop
         """
+        if self.prevtrue:
+            return
         # progressbar.config(mode='determinate', maximum=1500, value=1)
         self.cleardata()
 
+        self.openserial()
+        if not self.acquisitions:
+            return
         self.running = True
         self.prevtrue = True
-        self.openserial()
 
         self.dataread()
         try:
-            self.new_message("Collecting Data for Preview")
+            self.new_message("Previewing: adjust the probe, then press Start")
         except:
-            self.show_message("Collecting Data for Preview")
+            self.show_message("Previewing: adjust the probe, then press Start")
+
+        primary = self.acquisitions[0]
+        self.liveview.start(self.root, primary.data, primary.pyramids)
+        self.quality_label.grid(row=8, column=0, sticky='w', padx=20)
+        self.showquality()
 
         self.progressbar.config(mode='indeterminate')
         self.progressbar.start()
@@ -476,11 +510,14 @@ class SerialPlotting:
         # print("ICG")
         o = o_loadAIF()
         o.save_AIF_file(GUI_Vars(
-            self.root, self.fig, self.canvas, self.folderName, self.msg, self.current_dir, self.SaO2, self.HbO2))  # self.root)
+            self.root, self.fig, self.canvas, self.acquisitions[0].filename(''), self.msg, self.current_dir, self.SaO2, self.HbO2), self.streamed)  # self.root)
 
     def start_GUI(self):
         print(self.current_dir)
 
+        # rebuilds recordings left unfinished by a crash or power cut
+        recoverall(os.path.join(self.current_dir, "Data"))
+
         # Gives title to GUI
         self.root.title("Dye Densiometer GUI")
 
@@ -509,6 +546,9 @@ class SerialPlotting:
         # creates gui figure
         self.fig = Figure(figsize=(5, 4), dpi=100)
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.root)
+        self.liveview = LiveView(self.fig, self.canvas)
+        self.quality = SignalQuality()
+        self.quality_label = ttk.Label(self.root, font=('Arial', 9))
 
         # Creates a Frame for Selections
         # selframe = tk.Frame(self.root, background='Slategray3')
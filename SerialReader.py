@@ -0,0 +1,181 @@
+import threading
+import time
+import numpy as np
+import serial
+from RingBuffer import RingBuffer
+from parselines import parselines
+from parseframes import FRAME_SIZE, parseframes
+from SampleClock import SampleClock
+
+
+class SerialReader(threading.Thread):
+    """
+    Background acquisition thread that owns the serial port and drains it
+    continuously into a preallocated ring buffer.
+
+    Each row in the ring buffer is
+    [RED, IR, RED ambient, IR ambient, timestamp, sample counter].
+    The GUI never touches the port; it only polls the counters and pops rows.
+
+    With bulk=True (default) everything waiting in the port is read in one call
+    and parsed as a chunk; bulk=False reads and parses one ASCII line at a time.
+    protocol selects the wire format for bulk reads: 'ascii' lines, 'binary'
+    frames (see parseframes) or 'auto', which looks for valid binary frames in
+    the first data received and otherwise falls back to the ASCII parser.
+    For ASCII data the sample counter is simply the running sample count.
+
+    For binary frames, timestamps come from a SampleClock fitted to (device
+    sample counter, read time) pairs, so they are evenly spaced at the
+    measured device rate rather than bunched at the time each chunk happened
+    to be read. A parse count says nothing about when samples were taken
+    (lost lines shift it), so ASCII samples are only spaced at nominal_fs
+    back from each read time.
+    """
+
+    def __init__(self, port: str, baudrate: int = 230400, capacity: int = 2 ** 18,
+                 bulk: bool = True, protocol: str = 'auto', nominal_fs: float = None):
+        """
+        Constructor for SerialReader
+        """
+        super().__init__(daemon=True)
+        if protocol not in ('ascii', 'binary', 'auto'):
+            raise NameError("Invalid protocol")
+        self.bulk = bulk
+        self.protocol = protocol if bulk else 'ascii'
+
+        # short timeout so the thread notices a stop request promptly
+        self.arduino = serial.Serial(port, baudrate, timeout=0.05)
+        self.ring = RingBuffer(capacity, 6)
+        self.clock = SampleClock(nominal_fs)
+
+        # Counters polled by the GUI
+        self.samples = 0  # rows successfully parsed
+        self.skipped = 0  # lines (or corrupt frames) rejected by the parser
+        self.dropped = 0  # frames missing from the binary sample counter
+        self._lastseq = None
+        self.error = None  # SerialException that ended the thread, if any
+        self.cpu_time = 0  # CPU seconds used by the thread, set when it ends
+
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """
+        Reads and parses data until stop() is called, then closes the port
+        """
+        cpu_start = time.thread_time()
+        try:
+            if self.bulk:
+                self._run_bulk()
+            else:
+                self._run_lines()
+        except serial.SerialException as err:
+            # e.g. the probe was unplugged; the GUI sees error and no new samples
+            self.error = err
+            print(err)
+        finally:
+            self.cpu_time = time.thread_time() - cpu_start
+            self.arduino.close()
+
+    def _run_bulk(self):
+        """
+        Reads whatever is waiting in the port and parses it as one chunk
+        """
+        pending = b''
+        while not self._stop_event.is_set():
+            # blocks for up to the port timeout when nothing is waiting
+            data = self.arduino.read(self.arduino.in_waiting or 1)
+            if not data:
+                continue
+            timestamp = time.perf_counter()
+            pending += data
+
+            if self.protocol == 'auto':
+                # wait for enough bytes to recognise a few frames
+                if len(pending) < 4 * FRAME_SIZE:
+                    continue
+                values, _, _, _ = parseframes(pending)
+                self.protocol = 'binary' if len(values) >= 2 else 'ascii'
+                print("serial protocol =", self.protocol)
+
+            if self.protocol == 'binary':
+                values, seq, pending, nbad = parseframes(pending)
+                self._countdropped(seq)
+                seq = self.clock.unwrap(seq)
+            else:
+                values, pending, nbad = parselines(pending)
+                seq = np.arange(self.samples + 1, self.samples + len(values) + 1)
+            self.skipped += nbad
+            if len(values):
+                self._push(values, timestamp, seq)
+
+    def _countdropped(self, seq: np.ndarray):
+        """Counts gaps in the 32-bit binary sample counter
+
+        Args:
+            seq (ndarray): sample counters of the frames just decoded
+        """
+        if len(seq) == 0:
+            return
+        if self._lastseq is not None:
+            seq = np.concatenate(([self._lastseq], seq))
+        steps = np.diff(seq) % 2 ** 32
+        self.dropped += int(np.sum(steps[steps > 0] - 1))
+        self._lastseq = seq[-1]
+
+    def _push(self, values: np.ndarray, timestamp: float, seq: np.ndarray):
+        """Timestamps parsed samples with the clock model and adds them to the ring buffer
+
+        Args:
+            values (ndarray): (n, 4) RED, IR, RED ambient, IR ambient
+            timestamp (float): host time the chunk was read
+            seq (ndarray): (n,) unwrapped sample counters
+        """
+        # the read returned just after the newest sample arrived
+        if self.protocol == 'binary':
+            self.clock.update(seq[-1], timestamp)
+
+        rows = np.empty((len(values), 6))
+        rows[:, :4] = values
+        rows[:, 4] = self.clock.timestamps(seq, timestamp)
+        rows[:, 5] = seq
+        self.samples += self.ring.push(rows)
+
+    def _run_lines(self):
+        """
+        Reads and parses a single line per iteration
+        """
+        row = np.zeros((1, 4))
+        pending = b''
+        while not self._stop_event.is_set():
+            line = self.arduino.readline()
+            if not line:
+                continue
+
+            # a read timeout returns the line so far; wait for the rest of it
+            line = pending + line
+            if not line.endswith(b'\n'):
+                pending = line
+                continue
+            pending = b''
+
+            # Aquire and parse data from serial port
+            line_as_list = line.rstrip(b'\r\n').split(b',')
+            if len(line_as_list) != 4:  # Verifies that serial data is voltage values
+                self.skipped += 1
+                continue
+
+            try:
+                row[0, :] = [float(v) for v in line_as_list]
+            except ValueError:
+                self.skipped += 1
+                continue
+
+            self._push(row, time.perf_counter(), np.array([self.samples + 1]))
+
+    def stop(self):
+        """
+        Asks the thread to finish and waits for the port to be closed
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
@@ -0,0 +1,224 @@
+import numpy as np
+
+
+class SignalQuality:
+    """
+    Rolling signal-quality metrics for probe placement.
+
+    The metrics cover the last window_s seconds of the sample store and are
+    kept up to date incrementally: each update() only takes in the samples
+    that arrived since the last call and drops as many from the start of the
+    window. Sums give the means, ambient levels and clipped counts, sorted
+    copies of the window give the percentiles, and the Hann-windowed IR
+    spectrum is a sliding DFT of only the bins between the search band and
+    10 Hz (the Hann window is three shifted rectangular DFTs). Once per
+    window everything is recomputed from the store with FFTs, which also
+    follows changes of the sample rate and bounds rounding errors:
+
+        hr          heart rate (bpm) from the strongest IR spectral peak in
+                    the cardiac band, refined by parabolic interpolation
+        pi_ir/red   perfusion index (%): pulsatile amplitude / mean level
+        snr         pulse SNR (dB): power at the heart rate and its first
+                    harmonic against the rest of the 0.5-10 Hz band
+        ambient     mean RED and IR ambient levels (V)
+        clipped     fraction of RED/IR samples within 0.5 % of either rail
+    """
+
+    SUMS = ('REDminus', 'IRminus', 'REDamb', 'IRamb')
+    SORTED = ('REDminus', 'IRminus')
+
+    def __init__(self, window_s: float = 8, vmax: float = 5.0,
+                 band: tuple = (0.5, 4.0)):
+        """
+        Constructor for SignalQuality
+
+        Args:
+            window_s (float, optional): seconds analysed. Defaults to 8.
+            vmax (float, optional): ADC full scale (V) for clipping. Defaults to 5.0.
+            band (tuple, optional): heart rate search band (Hz). Defaults to (0.5, 4.0).
+        """
+        self.window_s = window_s
+        self.vmax = vmax
+        self.band = band
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the window, e.g. when the preview restarts on a new store
+        """
+        self._data = None
+        self._first = 0  # the window is samples [first, end) of the store
+        self._end = 0
+        self._slid = 0  # samples taken in since the last full computation
+        self._X = None
+
+    def _clipped(self, data, start: int, stop: int) -> int:
+        rail = 0.005 * self.vmax
+        raw = np.concatenate((data['RED'][start:stop], data['IR'][start:stop]))
+        return int(np.count_nonzero((raw <= rail) | (raw >= self.vmax - rail)))
+
+    @staticmethod
+    def _hann(X: np.ndarray) -> np.ndarray:
+        # np.hanning(n) = 0.5 - 0.25 exp(+2j pi i / (n - 1)) - 0.25 exp(-2j pi i / (n - 1)),
+        # so the windowed spectrum combines the plain DFT at f, f - d and f + d
+        K = len(X) // 3
+        return 0.5 * X[:K] - 0.25 * X[K:2 * K] - 0.25 * X[2 * K:]
+
+    def _kernel(self, m: int) -> tuple:
+        """DFT kernel for m samples at the tracked frequencies, cached per m
+
+        Args:
+            m (int): number of samples
+
+        Returns:
+            tuple: (E, rotate, delay) with E[:, i] = exp(-2j pi F i / fs),
+                rotate = exp(2j pi F m / fs) and delay = exp(-2j pi F (n - m) / fs)
+        """
+        if m not in self._kernels:
+            w = 2 * np.pi * self._F / self.fs
+            self._kernels[m] = (np.exp(-1j * np.outer(w, np.arange(m))),
+                                np.exp(1j * w * m), np.exp(-1j * w * (self._n - m)))
+        return self._kernels[m]
+
+    def _recompute(self, data):
+        """Sums and spectra of the newest window_s seconds, from scratch
+
+        Args:
+            data (SampleStore): store being filled by the acquisition
+        """
+        ts = data['ts']
+        end = len(ts)
+        first = int(np.searchsorted(ts, ts[-1] - self.window_s))
+        n = end - first
+        self.fs = (n - 1) / (ts[-1] - ts[first])
+        self._first, self._end, self._n, self._slid = first, end, n, 0
+
+        nfft = 1 << int(np.ceil(np.log2(n)))  # fixed for a given rate
+        self._df = self.fs / nfft
+        # bins from the search band to 10 Hz, and one either side
+        k = np.arange(max(0, int(self.band[0] / self._df) - 1), int(10 / self._df) + 2)
+        self._f = k * self._df
+
+        # the plain DFT at f, f - d and f + d, see _hann
+        d = self.fs / (n - 1)
+        self._F = np.concatenate((self._f, self._f - d, self._f + d))
+        shift = np.exp(2j * np.pi * np.arange(n) / (n - 1))
+
+        def dfts(x):
+            return np.concatenate([np.fft.fft(x * s, nfft)[k]
+                                   for s in (1, shift, shift.conj())])
+
+        self._kernels = {}  # the acquisition adds about the same m every time
+        self._X = dfts(data['IRminus'][first:end])
+        self._W = self._hann(dfts(np.ones(n)))  # for removing the mean
+        self._sums = {name: float(data[name][first:end].sum()) for name in self.SUMS}
+        self._nclipped = self._clipped(data, first, end)
+        self._sorted = {name: np.sort(data[name][first:end]) for name in self.SORTED}
+
+    def _slide(self, data, m: int):
+        """Moves the window m samples on
+
+        Args:
+            data (SampleStore): store being filled by the acquisition
+            m (int): new samples, fewer than the window holds
+        """
+        first, end = self._first, self._end
+        E, rotate, delay = self._kernel(m)
+        # drop the m oldest samples, move the start of the window, add the new
+        self._X = (rotate * (self._X - E @ data['IRminus'][first:first + m]) +
+                   delay * (E @ data['IRminus'][end:end + m]))
+
+        for name in self.SUMS:
+            self._sums[name] += (data[name][end:end + m].sum() -
+                                 data[name][first:first + m].sum())
+        self._nclipped += (self._clipped(data, end, end + m) -
+                           self._clipped(data, first, first + m))
+        for name in self.SORTED:
+            # remove each old value once (repeated values at consecutive places)
+            x = self._sorted[name]
+            old = np.sort(data[name][first:first + m])
+            drop = np.searchsorted(x, old) + np.arange(m) - np.searchsorted(old, old)
+            x = np.delete(x, drop)
+            new = np.sort(data[name][end:end + m])
+            self._sorted[name] = np.insert(x, np.searchsorted(x, new), new)
+        self._first += m
+        self._end += m
+        self._slid += m
+
+    def update(self, data) -> dict:
+        """Takes in the new samples and returns the metrics of the newest window
+
+        Args:
+            data (SampleStore): store being filled by the acquisition
+
+        Returns:
+            dict: metrics (see class docstring), or None until a full window
+                has been collected
+        """
+        ts = data['ts']
+        if data is not self._data or len(ts) < self._end:  # new or cleared store
+            self.reset()
+            self._data = data
+        if len(ts) < 2 or ts[-1] - ts[0] < self.window_s:
+            return None
+        m = len(ts) - self._end
+        if self._X is None or self._slid + m >= self._n:
+            self._recompute(data)
+        elif m:
+            self._slide(data, m)
+        n = self._n
+
+        S = self._hann(self._X) - self._sums['IRminus'] / n * self._W
+        P_ir = np.abs(S) ** 2
+        f = self._f
+        cardiac = (f >= self.band[0]) & (f <= self.band[1])
+        k = np.flatnonzero(cardiac)[np.argmax(P_ir[cardiac])]
+
+        # parabolic interpolation of the peak between FFT bins
+        shift = 0
+        if 0 < k < len(P_ir) - 1:
+            a, b, c = np.log(P_ir[k - 1:k + 2] + 1e-300)
+            if a - 2 * b + c < 0:
+                shift = 0.5 * (a - c) / (a - 2 * b + c)
+        hr = f[k] + shift * self._df
+
+        # power near the fundamental and first harmonic vs. the rest of the band
+        wide = (f >= self.band[0]) & (f <= 10)
+        width = max(0.1, 2 * self._df)
+        pulse = wide & ((np.abs(f - hr) <= width) | (np.abs(f - 2 * hr) <= width))
+        noise = P_ir[wide & ~pulse].sum()
+        snr = 10 * np.log10(P_ir[pulse].sum() / noise) if noise > 0 else np.inf
+
+        def perfusion(name):
+            # pulsatile peak-to-peak over the mean level, ignoring outliers;
+            # 5th and 95th percentiles interpolated as np.percentile does
+            x = self._sorted[name]
+            h = (n - 1) * np.array([0.05, 0.95])
+            i = np.minimum(h.astype(int), n - 2)
+            lo, hi = x[i] + (h - i) * (x[i + 1] - x[i])
+            mean = self._sums[name] / n
+            return 100 * (hi - lo) / mean if mean > 0 else np.nan
+
+        return {'hr': float(60 * hr), 'pi_ir': float(perfusion('IRminus')),
+                'pi_red': float(perfusion('REDminus')), 'snr': float(snr),
+                'ambient_red': float(self._sums['REDamb'] / n),
+                'ambient_ir': float(self._sums['IRamb'] / n),
+                'clipped': float(self._nclipped / (2 * n)), 'fs': float(self.fs)}
+
+    @staticmethod
+    def text(metrics: dict) -> str:
+        """Formats metrics for the GUI
+
+        Args:
+            metrics (dict): output of update(), or None
+
+        Returns:
+            str: two line summary
+        """
+        if metrics is None:
+            return "Signal quality: collecting..."
+        return (f"HR {metrics['hr']:.0f} bpm   SNR {metrics['snr']:.1f} dB   "
+                f"PI IR {metrics['pi_ir']:.2f}% RED {metrics['pi_red']:.2f}%\n"
+                f"ambient RED {1000 * metrics['ambient_red']:.0f} mV "
+                f"IR {1000 * metrics['ambient_ir']:.0f} mV   "
+                f"clipped {100 * metrics['clipped']:.1f}%")
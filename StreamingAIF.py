@@ -0,0 +1,256 @@
+import os
+import numpy as np
+from scipy import signal
+from estimatefs import estimatefs
+from selectheartrate import selectheartrate
+from FilterBank import upenntaps
+from SampleStore import SampleStore
+from RecordingWriter import RecordingWriter
+from TI_to_AIF import TI_to_AIF
+
+
+class StreamingAIF:
+    """
+    TI_to_AIF's 'upenn' processing run on the acquisition buffers while recording.
+
+    Once hr_window_s seconds have arrived, the heart rate is picked from their
+    Welch PSD (selectheartrate) and the band-pass is designed. From then on each
+    update() filters only the new samples with lfilter, carrying the filter
+    state zi between calls, so the filtered signal is the same as the offline
+    causal filter. Peaks are confirmed half a beat after they occur (the
+    find_peaks distance), each closes a beat whose trough and flux ratio phi
+    are computed at once, and the concentration of every beat is available
+    from trace() as soon as the baseline window tbl has passed. finish() at
+    Stop only handles the last beat and the final resampling.
+    """
+
+    # samples of the store before the first one TI_to_AIF processes: those the
+    # writer never saves and those TI_to_AIF skips when loading the file
+    SKIP = RecordingWriter.ISTART + TI_to_AIF.SKIP_ROWS
+
+    def __init__(self, gui_vars, wv: list = [804, 938], inv: bool = False,
+                 SaO2: float = 0, tHb: float = 0, tbl: list = [10, 60],
+                 hr: float = None, hr_window_s: float = 30):
+        """
+        Constructor for StreamingAIF
+
+        Args:
+            gui_vars (GUI_Vars): only current_dir is used (AIF_Processing)
+            wv (list, optional): probe LED wavelengths. Defaults to [804, 938].
+            inv (bool, optional): swap RED and IR. Defaults to False.
+            SaO2 (float, optional): oxygen saturation, 0 for 0.98. Defaults to 0.
+            tHb (float, optional): total hemoglobin, 0 for 14. Defaults to 0.
+            tbl (list, optional): reliable baseline data (s). Defaults to [10, 60].
+            hr (float, optional): heart rate (bpm) if already known, e.g. from
+                the preview; None picks it from the first hr_window_s seconds.
+                Defaults to None.
+            hr_window_s (float, optional): seconds used for the heart rate.
+                Defaults to 30.
+        """
+        self.ti = TI_to_AIF('', gui_vars, wv, inv, headless=True)
+        self.inv = inv
+        self.tbl = tbl
+        self.hr_window_s = hr_window_s
+        self.given_hr = hr
+        self.setvalues(SaO2, tHb)
+        self.reset()
+
+    def setvalues(self, SaO2: float, tHb: float):
+        """Sets SaO2 and tHb, with TI_to_AIF's defaults for values not entered
+
+        Args:
+            SaO2 (float): oxygen saturation
+            tHb (float): total hemoglobin
+        """
+        self.SaO2 = SaO2 if SaO2 else 0.98
+        self.tHb = tHb if tHb else 14
+        self._trace = None
+
+    def reset(self):
+        """
+        Forgets everything processed, for a new recording
+        """
+        self.n = 0  # samples of the store consumed
+        self.fs = None
+        self.hr = self.given_hr
+        self.confidence = None
+        self._hr_after = self.hr_window_s  # seconds of signal before the next try
+        self.taps = None
+        self.zi = None
+        self.distance = None
+        self.filtered = SampleStore(['fRED', 'fIR'])
+        self.peaks = []
+        self._scanned = 0
+        self.tir = []
+        self.phi = []
+        self.valid = []
+        self._trace = None
+
+    def _design(self, data) -> bool:
+        """Picks the heart rate and designs the band-pass once enough signal is in
+
+        Args:
+            data (SampleStore): store being filled by the acquisition
+
+        Returns:
+            bool: True when the filter is ready
+        """
+        ts = data['ts'][self.SKIP:]
+        if len(ts) < 3 or ts[-1] - ts[0] < self._hr_after:
+            return False
+        self.fs = estimatefs(ts)['fs']
+
+        RED, IR = self._channels(data, self.SKIP, len(data))
+        base = np.vstack((RED, IR))
+        if self.hr is None:
+            f, P = signal.welch(base, fs=self.fs, nperseg=base.shape[1] // 4)
+            try:
+                self.hr, self.confidence = selectheartrate(f, P, x=base, fs=self.fs)
+            except ValueError as e:
+                # probe off or not settled yet: try again with more signal
+                print("streaming AIF: no heart rate yet:", e)
+                self._hr_after += self.hr_window_s
+                return False
+        print("streaming AIF: heart rate = %.2f bpm, confidence = %s, fs = %.3f"
+              % (self.hr, self.confidence, self.fs))
+
+        fhr = self.hr / 60
+        self.taps = upenntaps(fhr, self.fs, os.path.join(self.ti.gui_vars.current_dir,
+                                                         'AIF_Processing'))
+        self.zi = np.zeros((2, len(self.taps) - 1))
+        self.distance = round((0.5 / fhr) * self.fs)
+        self.n = self.SKIP
+        return True
+
+    def _channels(self, data, start: int, stop: int) -> tuple:
+        RED = data['REDminus'][start:stop]
+        IR = data['IRminus'][start:stop]
+        if self.inv:
+            return IR, RED
+        return RED, IR
+
+    def update(self, data) -> int:
+        """Processes the samples added to the store since the last call
+
+        Args:
+            data (SampleStore): store being filled by the acquisition
+
+        Returns:
+            int: number of beats so far
+        """
+        n = len(data)
+        if n < self.n:  # the store was cleared for a new recording
+            self.reset()
+        if self.taps is None and not self._design(data):
+            return 0
+        if n == self.n:
+            return len(self.tir)
+
+        RED, IR = self._channels(data, self.n, n)
+        y, self.zi = signal.lfilter(self.taps, 1, -np.log(np.vstack((RED, IR))),
+                                    axis=1, zi=self.zi)
+        self.filtered.append(y.T)
+        self.n = n
+        self._findbeats(final=False)
+        return len(self.tir)
+
+    def _findbeats(self, final: bool):
+        """Confirms the peaks in the newly filtered samples and adds their beats
+
+        A peak is only confirmed once distance samples follow it, so that a
+        higher peak right after it would have been seen, as in find_peaks over
+        the whole recording.
+
+        Args:
+            final (bool): the recording has ended, confirm up to the last sample
+        """
+        fIR = self.filtered['fIR']
+        n = len(fIR)
+        start = max(self.peaks[-1] if self.peaks else 0, self._scanned - self.distance)
+        stop = n if final else n - self.distance
+        if stop - start < 3:
+            return
+        locs, _ = signal.find_peaks(fIR[start:], distance=self.distance)
+        for p in locs + start:
+            if p >= stop:
+                break
+            if self.peaks and p < self.peaks[-1] + self.distance:
+                continue
+            if self.peaks:
+                self._addbeat(self.peaks[-1], p)
+            self.peaks.append(p)
+        self._scanned = stop
+
+    def _addbeat(self, start: int, stop: int):
+        """Trough, amplitudes and flux ratio of the beat between two peaks,
+        as findtroughs and TI_to_AIF.filter_signal compute them
+
+        Args:
+            start (int): first peak
+            stop (int): next peak
+        """
+        fIR = self.filtered['fIR']
+        fRED = self.filtered['fRED']
+        k = int(np.argmin(fIR[start:stop]))
+        Air = 0.5 * (fIR[start] - fIR[start + k])
+        Ared = 0.5 * (fRED[start] - fRED[start + k - 1])
+
+        valid = bool(Ared != 0 and np.isfinite(Ared) and np.isfinite(Air))
+        phi = Air / Ared if valid else 0.0
+        if not np.isfinite(phi):
+            valid, phi = False, 0.0
+
+        self.tir.append(0.5 * ((start + 1) + stop) / self.fs)
+        self.phi.append(phi)
+        self.valid.append(valid)
+
+    def trace(self, partial: bool = False) -> tuple:
+        """Concentration of the valid beats so far
+
+        Args:
+            partial (bool, optional): also before the baseline window has
+                passed, with the baseline beats there are. Defaults to False.
+
+        Returns:
+            tuple: (tir, Ci) ndarrays, empty until the baseline window has passed
+        """
+        if not self.tir or (self.tir[-1] < self.tbl[1] and not partial):
+            return np.empty(0), np.empty(0)
+        if self._trace is None or len(self._trace[0]) != len(self.tir):
+            tir = np.array(self.tir)
+            valid = np.array(self.valid)
+            Ci = self.ti.concentration(np.array(self.phi), valid, tir,
+                                       self.SaO2, self.tHb, self.tbl)
+            self._trace = (tir, valid, Ci)
+        tir, valid, Ci = self._trace
+        return tir[valid], Ci[valid]
+
+    def finish(self, data=None, SaO2: float = None, tHb: float = None) -> tuple:
+        """Processes the rest of the recording and returns the AIF
+
+        Args:
+            data (SampleStore, optional): the final store, if samples arrived
+                after the last update. Defaults to None.
+            SaO2 (float, optional): oxygen saturation entered at Stop. Defaults to None.
+            tHb (float, optional): total hemoglobin entered at Stop. Defaults to None.
+
+        Returns:
+            tuple: ndarrays for t (time) and Ca (concentration), as
+                TI_to_AIF.filter_signal returns them, or None if the recording
+                is too short
+        """
+        if data is not None:
+            self.update(data)
+        if SaO2 is not None or tHb is not None:
+            self.setvalues(SaO2, tHb)
+        if self.taps is None:
+            return None
+        self._findbeats(final=True)
+
+        # even when the recording ended inside the baseline window
+        tir, Ci = self.trace(partial=True)
+        if len(tir) < 2:
+            return None
+        print("streaming AIF: invalid beats =", len(self.valid) - len(tir),
+              "of", len(self.valid))
+        return self.ti.resample(tir, Ci)
@@ -13,16 +13,23 @@ from scipy import interpolate, signal
 from scipy.signal import savgol_filter
 import matplotlib.pyplot as plt
 from getextinctioncoef import getextinctioncoef
-from remezord import remezord
+from FilterBank import upenntaps
+from firfilter import firfilter
+from findtroughs import findtroughs
+from estimatefs import estimatefs
+from selectheartrate import selectheartrate
 from typing import List
+from fractions import Fraction
 import tkinter as tk
 from tkinter import ttk
 import time
 from matplotlib.backends.backend_tkagg import (
     FigureCanvasTkAgg, NavigationToolbar2Tk)
 from AIF_Saving import AIF_Saving
-from collections import Counter
-import statistics
+from BinaryRecording import BinaryRecording
+from MinMaxPyramid import plotenvelope
+import csv
+import os
 
 
 class TI_to_AIF:
@@ -30,10 +37,26 @@ class TI_to_AIF:
     Handles interactive GUI and signal processing parts of creating the AIF file
     """
 
+    SKIP_ROWS = 3  # first data rows of a recording left out of the processing
+
     def __init__(self, filename: str, gui_vars, wv: List[float] = [805, 940], inv: bool = False,
-                 filt_method: str = 'upenn', savedata: int = 0):
+                 filt_method: str = 'upenn', savedata: int = 0,
+                 filt_phase: str = 'causal', workers: int = 1,
+                 fs_target: float = None, headless: bool = False,
+                 streamed: tuple = None):
         """
         Constructor for TI_to_AIF
+
+        filt_phase selects how the upenn band-pass is applied (see firfilter):
+        'causal' as lfilter did, 'compensated' without the group delay, or
+        'zerophase'. workers is the number of threads filtering the channels.
+        fs_target (e.g. 30) decimates the signals to about that rate before
+        the upenn band-pass, so it needs ~10x fewer taps; None keeps the full rate.
+        headless processes with the automatically selected heart rate, without
+        plots or clicks, and calculate_AIF returns (t, Ca). streamed is the
+        (hr, confidence, t, Ca) StreamingAIF computed while recording: its
+        heart rate is the one proposed, and accepting it uses its AIF instead
+        of filtering the recording again.
         """
 
         self.filename = filename
@@ -42,8 +65,16 @@ class TI_to_AIF:
         self.inv = inv
         self.filt_method = filt_method
         self.savedata = savedata
+        self.filt_phase = filt_phase
+        self.workers = workers
+        self.fs_target = fs_target
+        self.headless = headless
+        self.streamed = streamed
 
         self.x0 = 0
+        self.hr_confidence = 0
+        self.fs = None
+        self._extinction = None
         self.x1 = []
 
         self.collect_x0 = False
@@ -52,12 +83,19 @@ class TI_to_AIF:
     def calculate_AIF(self):
         """
         Main function for TI_to_AIF. Calculates PSD for heart rate using pwelch.
-        """
-        np.seterr(divide='raise', invalid='raise')
 
-        fid = open(self.filename, "r")
-        X1 = np.loadtxt(fid, skiprows=6, delimiter=',')
-        fid.close()
+        Returns:
+            tuple: (t, Ca) when headless, else None (the GUI takes over)
+        """
+        if self.filename.endswith('.bin'):
+            # binary recordings are memory-mapped; drop the same first rows
+            # that skiprows removes from the CSV
+            X1 = BinaryRecording(self.filename).toarray()[self.SKIP_ROWS:]
+        else:
+            fid = open(self.filename, "r")
+            # SaO2, HbO2 and field name rows, then the skipped data rows
+            X1 = np.loadtxt(fid, skiprows=3 + self.SKIP_ROWS, delimiter=',')
+            fid.close()
         if self.gui_vars.SaO2 != 0:
             SaO2 = self.gui_vars.SaO2
         else:
@@ -69,31 +107,12 @@ class TI_to_AIF:
 
         print("Sa02 = ", SaO2, ", tHb = ", tHb)
 
-        # Calculate sampling Rate
-        len_X1 = len(X1[:, 6])
-        tint = [None] * len_X1  # list for int values for timestamps
-        sdps = []  # list for number of data points for each second
-
-        for i in range(len_X1):
-            tint[i] = int(X1[i, 6])
-
-        tot = Counter(tint)  # Gives totals of data points for each second
-
-        # finds least common time counter to delete last second from averages
-        lcn = tot.most_common()[:-1-1:-1]
-        print("lcn = ", lcn)
-
-        llcn = (lcn[0])
-        # print(llcn[0])
-        del tot[llcn[0]]
-        print(tot)
-
-        mean = statistics.mean(tot.values())
-        print("mean = ", mean)
-
-        fs = 300  # sampling rate
-        fs = round(mean)  # sampling rate
+        # Sampling rate measured by the acquisition clock model, if recorded
+        fs = self.recorded_fs()
+        if fs is None:
+            fs = self.estimate_fs(X1)
         print("sampling rate = ", fs)
+        self.fs = fs
         tbl = [10, 60]  # reliable baseline data
 
         # red and ir channels (raw)
@@ -115,10 +134,63 @@ class TI_to_AIF:
         # powerspectrum
         f, P = signal.welch(welch_base, fs=fs, nperseg=welch_base.shape[1]/4)
 
+        # automatic heart rate; in the GUI it is the default the user can override
+        if self.streamed is not None:
+            self.x0 = self.streamed[0]
+            self.hr_confidence = self.streamed[1] or 0  # None when the hr was given
+            print("heart rate used while recording = %.2f bpm" % self.x0)
+        else:
+            try:
+                self.x0, self.hr_confidence = selectheartrate(f, P, x=welch_base, fs=fs)
+                print("heart rate = %.2f bpm, confidence = %.2f" % (self.x0, self.hr_confidence))
+            except ValueError as e:
+                # too short or flat: only a click can choose the heart rate
+                if self.headless:
+                    raise
+                print("no automatic heart rate:", e)
+                self.x0 = None
+
+        if self.headless:
+            return self.filter_signal(RED, IR, fs, SaO2, tHb, tbl)
+
         # Embeds PSD plot into GUI, and allows user to choose points
         bpm = f * 60
         self.embedHRplot(bpm, P, RED, IR, fs, SaO2, tHb, tbl)
 
+    def recorded_fs(self):
+        """Reads the sample rate stored with the recording by the acquisition
+
+        Returns:
+            float: sample rate in Hz, or None if the recording has none
+        """
+        clockfile = self.filename.rsplit('_Volts', 1)[0] + '_Clock.csv'
+        if os.path.exists(clockfile):
+            with open(clockfile, 'r', newline='') as f:
+                clock = {row[0]: row[1] for row in csv.reader(f) if len(row) == 2}
+            if clock.get('fs') not in (None, '', 'None'):
+                return float(clock['fs'])
+        if self.filename.endswith('.bin'):
+            fs = BinaryRecording(self.filename).fs
+            if fs > 0:
+                return fs
+        return None
+
+    def estimate_fs(self, X1):
+        """Estimates the sample rate from the timestamp column
+
+        Args:
+            X1 (ndarray): recording, timestamps in column 6
+
+        Returns:
+            float: samples per second
+        """
+        est = estimatefs(X1[:, 6])
+        print("timestamp jitter = ", est['jitter'], ", gaps = ", len(est['gaps']),
+              ", backwards steps = ", est['backwards'])
+        for index, length in est['gaps']:
+            print("  gap of %.3f s after sample %d" % (length, index))
+        return est['fs']
+
     def embedHRplot(self, bpm, P, RED, IR, fs, SaO2, tHb, tbl):
         """Embeds PSD plot for heart rate into Tkinter GUI, and allows user to choose points
 
@@ -132,21 +204,13 @@ class TI_to_AIF:
             tHb (float): total hemoglobin
             tbl (list[int]): reliable baseline data
         """
-        def onclick(event):
-            """Saves x-coordinate of point clicked, draws vertical line.
-
-            Args:
-                event (Event): clicking event
+        def accept():
+            """Runs the signal processing at the heart rate in self.x0
             """
             if self.collect_x0:
-                # Saves x-coord
                 self.collect_x0 = False
-                self.x0 = event.xdata
-                # Plots vertical line
-                ax.axvline(self.x0, color='red', linestyle='dashed')
-                self.gui_vars.canvas.draw()
-                self.gui_vars.canvas.flush_events()
-                # time.sleep(1)
+                self.accept_button.destroy()
+                streamed = self.streamed is not None and self.x0 == self.streamed[0]
 
                 # Resize Tkinter window
                 self.msg = ttk.Label(self.gui_vars.root, text='  ')
@@ -155,16 +219,44 @@ class TI_to_AIF:
                 print("x0 = ", self.x0)
                 self.gui_vars.fig.clf()
 
-                # Run signal processing code on Red and IR signals
-                self.filter_signal(RED, IR, fs, SaO2, tHb, tbl)
+                if streamed:
+                    # the AIF computed while recording, at this heart rate
+                    self.embedAIFplot(*self.streamed[2:])
+                else:
+                    # Run signal processing code on Red and IR signals
+                    self.filter_signal(RED, IR, fs, SaO2, tHb, tbl)
+
+        def onclick(event):
+            """Saves x-coordinate of point clicked, draws vertical line.
+
+            Args:
+                event (Event): clicking event
+            """
+            if self.collect_x0 and event.xdata is not None:
+                # Saves x-coord, overriding the automatic heart rate
+                self.x0 = event.xdata
+                # Plots vertical line
+                if auto_line is not None:
+                    auto_line.set_alpha(0.3)
+                ax.axvline(self.x0, color='red', linestyle='dashed')
+                self.gui_vars.canvas.draw()
+                self.gui_vars.canvas.flush_events()
+                accept()
 
         # Enables contents of onclick function for this instance of mpl_connect
         self.collect_x0 = True
 
-        # Plot data and embed plot in GUI
+        # Plot data and embed plot in GUI, marking the automatic heart rate
         ax = self.gui_vars.fig.add_subplot()
-        ax.plot(bpm.T, P[0, :], bpm.T, P[1, :])
-        ax.set_title("Select center of the heart-rate peak")
+        plotenvelope(ax, bpm, P[0, :])
+        plotenvelope(ax, bpm, P[1, :])
+        auto_line = None
+        if self.x0 is not None:
+            auto_line = ax.axvline(self.x0, color='green', linestyle='dashed')
+            ax.set_title("Heart rate %.1f bpm (confidence %.2f): accept or click the peak"
+                         % (self.x0, self.hr_confidence))
+        else:
+            ax.set_title("Select center of the heart-rate peak")
         ax.set_xlim(12, 180)
         ax.set_xlabel("frequency (beats per min).")
         self.gui_vars.fig.subplots_adjust(left=.12)
@@ -178,6 +270,10 @@ class TI_to_AIF:
         # placing the canvas on the Tkinter window
         self.gui_vars.root.geometry("525x715")
         self.gui_vars.canvas.get_tk_widget().grid(row=9, columnspan=3, padx=10)
+        self.accept_button = ttk.Button(self.gui_vars.root, command=accept)
+        if self.x0 is not None:
+            self.accept_button.config(text="Use %.1f bpm" % self.x0)
+            self.accept_button.grid(row=8, column=1)
 
         self.gui_vars.root.mainloop()
 
@@ -198,6 +294,9 @@ class TI_to_AIF:
         Returns:
             [tuple]: ndarrays for t (time) and Ca (concentration)
         """
+        # everything below (filter design, peaks, tmpt) runs at the reduced rate
+        if self.filt_method == 'upenn' and self.fs_target and fs > self.fs_target:
+            RED, IR, fs = self.decimate(RED, IR, fs)
 
         ghr = self.x0
         fhr = ghr / 60
@@ -208,56 +307,31 @@ class TI_to_AIF:
             fRED = savgol_filter(-np.log(RED), 20, 3)
             fIR = savgol_filter(-np.log(IR), 20, 3)
         elif self.filt_method == 'upenn':  # custom filter: upenn method (slow)
-            fhwid = 0.10
-            fl = (1 - fhwid) * fhr
-            fh = (1 + fhwid) * fhr
-
-            # Correcting stopband and passband values for remezord
-            A_SB_inp = 60
-            A_SB = 10.**(-A_SB_inp/20.)
-            A_PB_inp = 1
-            A_PB = (10. ** (A_PB_inp / 20.) - 1) / \
-                (10 ** (A_PB_inp / 20.) + 1) * 2
-            A_SB2_inp = 60
-            A_SB2 = 10. ** (-A_SB2_inp / 20.)
-
-            # Generate remez filter parameters with remezord
-            (N_upenn, F_upenn, A_upenn, W_upenn) = \
-                remezord([fl - 0.2, fl, fh, fh + 0.2], [1, 0, 1],
-                         [A_SB, A_PB, A_SB2], Hz=fs)
-
-            # Generate taps using remez
-            taps = signal.remez(N_upenn, F_upenn*fs, [0, 1, 0], weight=W_upenn,
-                                fs=fs)
-
-            # Filter Red and IR signals
-            fRED = signal.lfilter(taps, 1, -np.log(RED))
-            fIR = signal.lfilter(taps, 1, -np.log(IR))
+            # remez design is memoized, and skipped entirely when a filter
+            # bank for this rate exists in AIF_Processing (see FilterBank)
+            taps = upenntaps(fhr, fs, os.path.join(self.gui_vars.current_dir,
+                                                   'AIF_Processing'))
+
+            # Filter Red and IR signals together (FFT overlap-add for long taps)
+            fRED, fIR = firfilter(taps, -np.log(np.vstack((RED, IR))),
+                                  self.filt_phase, workers=self.workers)
         else:  # if filt_method isn't valid, raise NameError
             raise NameError("Invalid filt_method")
 
         # find the peaks - min peak distance is defined as half the heart-rate
         locsir, _ = signal.find_peaks(fIR, distance=round((0.5 / fhr) * fs))
-        pksir = np.array(self.find_peak_heights(fIR, locsir))
+        pksir = self.find_peak_heights(fIR, locsir)
 
-        # find the troughs
-        tir = np.zeros((1, len(locsir) - 1))
-        minir = np.zeros((1, len(locsir) - 1))
-        locsirmin = np.zeros((1, len(locsir) - 1))
+        # find the troughs (one segment reduction over all beats)
         pksir = pksir[0:len(pksir) - 1].T
-        tmpt = np.array([i / fs for i in range(1, len(fIR) + 1)])
-        for k in range(len(locsir) - 1):
-            tir[0, k] = np.mean(tmpt[locsir[k]:locsir[k+1]])
-            locsir_sublist = np.array(fIR[locsir[k]:locsir[k+1]])
-            minir[0, k] = locsir_sublist.min()
-            loctmp = np.where(locsir_sublist == minir[0, k])[0][0]
-            locsirmin[0, k] = locsir[k] + loctmp - 1
+        tmpt = np.arange(1, len(fIR) + 1) / fs
+        tir, minir, locsirmin = findtroughs(fIR, locsir, tmpt)
 
         # interpolate red from IR peaks and troughs. uses scipy's interpolate
         # library
         f_interp = interpolate.interp1d(tmpt, fRED)
-        pksred = f_interp(tmpt[locsir[0:len(locsir) - 1].tolist()])
-        minred = f_interp(tmpt[[int(i) for i in locsirmin[0, :]]])
+        pksred = f_interp(tmpt[locsir[0:len(locsir) - 1]])
+        minred = f_interp(tmpt[locsirmin[0, :].astype(int)])
 
         # truncate in case some channels are shorter than others (by usually 1 or
         # 2)
@@ -272,47 +346,103 @@ class TI_to_AIF:
         Ared = 0.5 * (pksred[:] - minred[:])
         Air = 0.5 * (pksir[:] - minir[:])
 
-        eHbO2red, eHbred, _, eicg = getextinctioncoef(
-            self.gui_vars, np.array([self.wv[0]]))
-        eHbO2ir, eHbir, _, _ = getextinctioncoef(
-            self.gui_vars, np.array([self.wv[1]]))
+        # Flux of light, phi = Air / Ared. Beats with a zero or non-finite
+        # amplitude are invalid: phi is 0 there and they are left out of the
+        # baseline and the interpolation below
+        Air = Air.reshape(-1)
+        tir = tir[0, 0:trunc]
+        valid = (Ared != 0) & np.isfinite(Ared) & np.isfinite(Air)
+        phi = np.zeros_like(Air)
+        np.divide(Air, Ared, out=phi, where=valid)
+        valid &= np.isfinite(phi)
+        phi[~valid] = 0
+        print("invalid beats =", np.count_nonzero(~valid), "of", len(valid))
 
-        eHbO2red = eHbO2red[0]
-        eHbred = eHbred[0]
-        eicg = eicg[0]
-        eHbO2ir = eHbO2ir[0]
-        eHbir = eHbir[0]
+        Ci = self.concentration(phi, valid, tir, SaO2, tHb, tbl)
+        t, Ca = self.resample(tir[valid], Ci[valid])
 
-        # Flux of light. Corrects for div/0 errors in Air and Ared
-        # phi = Air / Ared
-        phi = np.array([])
+        if not self.headless:
+            self.embedAIFplot(t, Ca)
 
-        for i in range(len(Air.T)):
-            try:
-                phi = np.append(phi, Air[:, i][0] / Ared[i])
-            except FloatingPointError:
-                phi = np.append(phi, 0)
-            except RuntimeError:
-                phi = np.append(phi, 0)
+        if self.savedata == 1:
+            xout = np.hstack(
+                (t.reshape((len(t), 1)), Ca.reshape((len(Ca), 1))))
 
-        I = np.logical_and(tir > tbl[0], tir < tbl[1])
+            # parse the filename of the input file to suggest where to save the
+            # output and what to call it.
+            slashloc = self.strfind(self.filename, "/")
+
+            sugpath = self.filename[0:slashloc[-1]+1]
+            fnamein = self.filename[slashloc[-1]+1:]
+
+            emdashloc = self.strfind(fnamein, '_')
+            fnameout = 'AIF_' + \
+                fnamein[(emdashloc[1]+1):(fnamein.find('.xls')-1)] + '.csv'
+
+            # save file
+            np.savetxt(sugpath + fnameout, xout, delimiter=",")
+
+        return (t, Ca)
+
+    def extinction(self) -> tuple:
+        """Extinction coefficients at the probe wavelengths, read once
+
+        Returns:
+            tuple: eHbO2red, eHbred, eicg, eHbO2ir, eHbir
+        """
+        if self._extinction is None:
+            eHbO2red, eHbred, _, eicg = getextinctioncoef(
+                self.gui_vars, np.array([self.wv[0]]))
+            eHbO2ir, eHbir, _, _ = getextinctioncoef(
+                self.gui_vars, np.array([self.wv[1]]))
+            self._extinction = (eHbO2red[0], eHbred[0], eicg[0], eHbO2ir[0], eHbir[0])
+        return self._extinction
+
+    def concentration(self, phi, valid, tir, SaO2, tHb, tbl):
+        """Converts the flux ratio of each beat to ICG concentration
+
+        Args:
+            phi (ndarray): flux ratio Air / Ared per beat
+            valid (ndarray): beats with a usable phi
+            tir (ndarray): beat times (s)
+            SaO2 (float): oxygen saturation
+            tHb (float): total hemoglobin
+            tbl (list[int]): reliable baseline data
+
+        Returns:
+            ndarray: Ci per beat (uM)
+        """
+        eHbO2red, eHbred, eicg, eHbO2ir, eHbir = self.extinction()
+
+        I = (tir > tbl[0]) & (tir < tbl[1]) & valid
         # choose a baseline Phi for d calculation.
-        phi0 = np.mean(phi[I.reshape((len(I.T),))])
+        phi0 = np.mean(phi[I])
 
         # distance of expansion, which is converted to concentration.
         d = phi0 * (eHbO2ir * SaO2 + eHbir * (1 - SaO2)) / (eHbO2red * SaO2 +
                                                             eHbred * (1 - SaO2))
 
         # find a d value to bring Ci to zero.
-        Ci = (phi / d * (eHbO2ir * SaO2 + eHbir * (1 - SaO2)) - eHbO2red * SaO2 -
-              eHbred * (1 - SaO2)) * tHb / eicg
+        return (phi / d * (eHbO2ir * SaO2 + eHbir * (1 - SaO2)) - eHbO2red * SaO2 -
+                eHbred * (1 - SaO2)) * tHb / eicg
+
+    @staticmethod
+    def resample(tir, Ci):
+        """Resamples the per-beat concentration to an even time grid and smooths it
 
+        Args:
+            tir (ndarray): times of the valid beats (s)
+            Ci (ndarray): their concentrations
+
+        Returns:
+            tuple: ndarrays for t (time) and Ca (concentration)
+        """
         # iterpolate t and ca to the current temporal resolution of the SPY Elite,
         # which is fast enough preserve any features. sgolay filtering 51 x 3.
-        t = np.linspace(tir[0, 0], tir[0, -1],
-                        num=int(np.round(tir[0, -1] / 0.267)))
+        t = np.linspace(tir[0], tir[-1],
+                        num=int(np.round(tir[-1] / 0.267)))
 
-        cainterp = interpolate.PchipInterpolator(tir[0, :], Ci)
+        cainterp = interpolate.PchipInterpolator(tir, Ci)
         ci_interp = cainterp(t)
 
         # interpolation to correct for nonlinearly spaced time points
@@ -322,28 +452,30 @@ class TI_to_AIF:
         # print("ci_result = ", ci_result)
 
         Ca = savgol_filter(ci_result, 51, 3)
+        return t, Ca
 
-        self.embedAIFplot(t, Ca)
-
-        if self.savedata == 1:
-            xout = np.hstack(
-                (t.reshape((len(t), 1)), Ca.reshape((len(Ca), 1))))
-
-            # parse the filename of the input file to suggest where to save the
-            # output and what to call it.
-            slashloc = self.strfind(self.filename, "/")
+    def decimate(self, RED, IR, fs):
+        """Anti-aliased polyphase decimation of both channels to about fs_target
 
-            sugpath = self.filename[0:slashloc[-1]+1]
-            fnamein = self.filename[slashloc[-1]+1:]
+        The signals are extended linearly past both ends rather than with
+        zeros, so the filter does not pull the first and last samples towards
+        0 V, which -log() would turn into large spikes.
 
-            emdashloc = self.strfind(fnamein, '_')
-            fnameout = 'AIF_' + \
-                fnamein[(emdashloc[1]+1):(fnamein.find('.xls')-1)] + '.csv'
-
-            # save file
-            np.savetxt(sugpath + fnameout, xout, delimiter=",")
+        Args:
+            RED (ndarray): Red voltage signal
+            IR (ndarray): IR voltage signal
+            fs (float): sampling rate
 
-        return (t, Ca)
+        Returns:
+            tuple: RED, IR and the reduced sampling rate
+        """
+        ratio = Fraction(self.fs_target / fs).limit_denominator(100)
+        up, down = ratio.numerator, ratio.denominator
+        X = signal.resample_poly(np.vstack((RED, IR)), up, down, axis=1,
+                               padtype='line')
+        fs_eff = fs * up / down
+        print("decimated by %d/%d to %.3f Hz" % (up, down, fs_eff))
+        return X[0], X[1], fs_eff
 
     def embedAIFplot(self, t, Ca):
         """Embeds raw AIF plot (concentration vs time) into Tkinter GUI. Allows user to choose left and right bounds of data to save
@@ -391,7 +523,7 @@ class TI_to_AIF:
 
         # Plot data
         ax = self.gui_vars.fig.add_subplot()
-        ax.plot(t, Ca)
+        plotenvelope(ax, t, Ca)
         ax.set_xlabel('time (sec)')
         ax.set_ylabel('Concentration (uM)')
         ax.set_title(
@@ -429,19 +561,14 @@ class TI_to_AIF:
 
         return result
 
-    def find_peak_heights(self, data: list, indices: list) -> list:
-        """Returns a list of the peak heights in data based on the indices of these peaks        
+    def find_peak_heights(self, data: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        """Returns the peak heights in data based on the indices of these peaks
 
         Args:
-            data (list): data in which peaks need to be found
-            indices (list): list of indices where peaks appear
+            data (ndarray): data in which peaks need to be found
+            indices (ndarray): indices where peaks appear
 
         Returns:
-            list: returns list of the heights of the peaks specified in indices
+            ndarray: heights of the peaks specified in indices
         """
-
-        result = []
-        for i in indices:
-            result.append(data[i])
-
-        return result
+        return np.asarray(data)[np.asarray(indices, dtype=np.int64)]
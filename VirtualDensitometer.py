@@ -0,0 +1,207 @@
+"""
+Virtual densitometer for hardware-free acquisition testing (Linux/macOS).
+
+Opens a pseudo-terminal and streams synthetic probe data on it, so the
+unmodified acquisition path can be pointed at the printed port name instead
+of a COM port:
+
+    python VirtualDensitometer.py --rate 300 --hr 72 --bolus-time 30
+"""
+
+import argparse
+import os
+import threading
+import time
+import tty
+import numpy as np
+from parseframes import packframes
+
+
+class VirtualDensitometer(threading.Thread):
+    """
+    Emulates the probe: RED/IR/ambient voltages with a cardiac pulse, an
+    optional ICG bolus, noise and malformed lines, sent at a fixed rate in Hz
+    over a pty as ASCII lines or binary frames.
+    """
+
+    def __init__(self, rate: float = 300, hr: float = 72, bolus_time: float = 30,
+                 bolus_peak: float = 10, noise: float = 0.0005,
+                 malformed: float = 0, protocol: str = 'ascii', seed: int = None):
+        """
+        Constructor for VirtualDensitometer
+
+        Args:
+            rate (float, optional): samples per second. Defaults to 300.
+            hr (float, optional): heart rate in beats per minute. Defaults to 72.
+            bolus_time (float, optional): ICG injection time in seconds, None for
+                no bolus. Defaults to 30.
+            bolus_peak (float, optional): peak ICG concentration (uM). Defaults to 10.
+            noise (float, optional): standard deviation of added noise (V).
+                Defaults to 0.0005.
+            malformed (float, optional): fraction of ASCII lines corrupted.
+                Defaults to 0.
+            protocol (str, optional): 'ascii' or 'binary'. Defaults to 'ascii'.
+            seed (int, optional): random seed. Defaults to None.
+        """
+        super().__init__(daemon=True)
+        if protocol not in ('ascii', 'binary'):
+            raise NameError("Invalid protocol")
+        self.rate = rate
+        self.hr = hr
+        self.bolus_time = bolus_time
+        self.bolus_peak = bolus_peak
+        self.noise = noise
+        self.malformed = malformed
+        self.protocol = protocol
+        self.rng = np.random.default_rng(seed)
+
+        # the slave end is what the acquisition code opens; it is switched to
+        # raw mode straight away so nothing is echoed back before that happens
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+
+        self.sent = 0  # samples generated
+        self.overflowed = 0  # samples lost because the pty buffer was full
+        self.on_send = None  # optional callback(first_seq, n, host_time)
+        self._stop_event = threading.Event()
+
+    def concentration(self, t: np.ndarray) -> np.ndarray:
+        """Gamma-variate ICG concentration curve with a small recirculation
+
+        Args:
+            t (ndarray): time in seconds
+
+        Returns:
+            ndarray: concentration (uM)
+        """
+        if self.bolus_time is None:
+            return np.zeros_like(t)
+        tau = np.clip(t - self.bolus_time, 0, None)
+        first = (tau / 8) ** 3 * np.exp(3 * (1 - tau / 8))
+        tau2 = np.clip(tau - 20, 0, None)
+        second = 0.15 * (tau2 / 10) ** 2 * np.exp(2 * (1 - tau2 / 10))
+        return self.bolus_peak * (first + second)
+
+    def samples(self, seq: np.ndarray) -> np.ndarray:
+        """Generates the probe values for the given sample numbers
+
+        Args:
+            seq (ndarray): sample numbers
+
+        Returns:
+            ndarray: (n, 4) RED, IR, RED ambient, IR ambient voltages
+        """
+        t = seq / self.rate
+        phase = 2 * np.pi * self.hr / 60 * t
+        # systolic upstroke plus a dicrotic wave
+        pulse = np.sin(phase) + 0.35 * np.sin(2 * phase - 0.8)
+        resp = 0.002 * np.sin(2 * np.pi * 0.25 * t)
+
+        # ICG absorbs strongly at the RED wavelength: it lowers the RED level
+        # and raises its pulsatile amplitude relative to IR
+        c = self.concentration(t)
+        red_dc = 1.2 * np.exp(-0.02 * c)
+        red = red_dc * (1 - 0.010 * (1 + 0.08 * c) * pulse + resp)
+        ir = 1.5 * (1 - 0.012 * pulse + resp)
+
+        mains = 0.002 * np.sin(2 * np.pi * 60 * t)
+        redamb = 0.02 + mains
+        iramb = 0.025 + mains
+
+        values = np.column_stack((red + redamb, ir + iramb, redamb, iramb))
+        return values + self.rng.normal(0, self.noise, values.shape)
+
+    def encode(self, values: np.ndarray, seq: np.ndarray) -> bytes:
+        """Encodes samples in the selected protocol
+
+        Args:
+            values (ndarray): (n, 4) sample values
+            seq (ndarray): sample numbers
+
+        Returns:
+            bytes: data to send
+        """
+        if self.protocol == 'binary':
+            return packframes(values, seq)
+
+        lines = [b'%.6f,%.6f,%.6f,%.6f\r\n' % tuple(row) for row in values.tolist()]
+        if self.malformed:
+            for i in np.flatnonzero(self.rng.random(len(lines)) < self.malformed):
+                # a truncated line or a burst of garbage
+                lines[i] = lines[i][:7] + b'\r\n' if i % 2 else b'#?,,x\r\n'
+        return b''.join(lines)
+
+    def run(self):
+        """
+        Sends every sample that is due, in small batches, until stop()
+        """
+        start = time.perf_counter()
+        while not self._stop_event.is_set():
+            now = time.perf_counter()
+            due = int((now - start) * self.rate)
+            if due > self.sent:
+                seq = np.arange(self.sent, due)
+                data = self.encode(self.samples(seq), seq)
+                if self.on_send is not None:
+                    self.on_send(self.sent, len(seq), now)
+                try:
+                    written = os.write(self.master, data)
+                except BlockingIOError:
+                    written = 0
+                if written < len(data):
+                    # like a UART with nobody reading: the rest is lost
+                    self.overflowed += round(len(seq) * (1 - written / len(data)))
+                self.sent = due
+            time.sleep(0.002)
+
+    def stop(self):
+        """
+        Stops sending; the pty stays open so a reader can drain it
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def close(self):
+        """
+        Closes the pty
+        """
+        os.close(self.master)
+        os.close(self.slave)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Virtual densitometer on a pty")
+    parser.add_argument('--rate', type=float, default=300, help="samples per second")
+    parser.add_argument('--hr', type=float, default=72, help="heart rate (bpm)")
+    parser.add_argument('--bolus-time', type=float, default=30,
+                        help="ICG injection time (s), negative for none")
+    parser.add_argument('--bolus-peak', type=float, default=10,
+                        help="peak ICG concentration (uM)")
+    parser.add_argument('--noise', type=float, default=0.0005, help="noise (V)")
+    parser.add_argument('--malformed', type=float, default=0,
+                        help="fraction of malformed ASCII lines")
+    parser.add_argument('--protocol', choices=('ascii', 'binary'), default='ascii')
+    parser.add_argument('--duration', type=float, default=None,
+                        help="seconds to run (default: until Ctrl+C)")
+    args = parser.parse_args()
+
+    device = VirtualDensitometer(
+        args.rate, args.hr, args.bolus_time if args.bolus_time >= 0 else None,
+        args.bolus_peak, args.noise, args.malformed, args.protocol)
+    device.start()
+    print("Virtual densitometer on", device.port)
+
+    try:
+        if args.duration is None:
+            while True:
+                time.sleep(1)
+        else:
+            time.sleep(args.duration)
+    except KeyboardInterrupt:
+        pass
+    device.stop()
+    device.close()
+    print("samples sent =", device.sent, ", overflowed =", device.overflowed)
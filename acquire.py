@@ -0,0 +1,121 @@
+"""
+Headless acquisition: records one or more probes without the Tk GUI.
+
+Runs the same reader -> store -> writer pipeline as SerialPlotting (see
+Acquisition) at full speed and writes the same layout under Data/:
+
+    python acquire.py --port COM3 --patient DH-001 --injection ICG-01 \
+        --sao2 0.98 --hbo2 14 --duration 120
+
+Without --duration it records until Ctrl+C or SIGTERM.
+"""
+
+import argparse
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from Acquisition import Acquisition, portlabel, recordingname
+from RecordingJournal import recoverall
+
+
+def acquire(ports: list, patient: str, injection: str, SaO2: str = '0',
+            HbO2: str = '0', duration: float = None, data_dir: str = 'Data',
+            recording_format: str = 'csv', notes: str = '', poll_ms: float = 20,
+            stop_event: threading.Event = None) -> str:
+    """Records the given ports until duration has passed or stop_event is set
+
+    Args:
+        ports (list): serial ports, one probe each
+        patient (str): patient ID
+        injection (str): injection ID
+        SaO2 (str, optional): oxygen saturation for the header. Defaults to '0'.
+        HbO2 (str, optional): total hemoglobin for the header. Defaults to '0'.
+        duration (float, optional): seconds to record, None for until stopped.
+            Defaults to None.
+        data_dir (str, optional): directory the recording folder is created in.
+            Defaults to 'Data'.
+        recording_format (str, optional): 'csv' or 'bin'. Defaults to 'csv'.
+        notes (str, optional): saved as <folder>_Notes.txt if given. Defaults to ''.
+        poll_ms (float, optional): how often samples are collected from the
+            readers. Defaults to 20.
+        stop_event (Event, optional): set to stop recording. Defaults to None.
+
+    Returns:
+        str: absolute path of the recording without suffix
+    """
+    if recording_format not in ('csv', 'bin'):
+        raise NameError("Invalid recording format")
+    stop_event = stop_event or threading.Event()
+
+    folderName = recordingname(patient, injection)
+    path = os.path.join(os.path.abspath(data_dir), folderName)
+    os.makedirs(path)
+    prefix = os.path.join(path, folderName)
+
+    label = len(ports) > 1
+    acquisitions = [Acquisition(port, label=portlabel(port) if label else '')
+                    for port in ports]
+    try:
+        for acq in acquisitions:
+            acq.open()
+
+        # probes recorded together share the same zero time
+        t0 = time.perf_counter() if label else None
+        for acq in acquisitions:
+            acq.record(prefix, patient, injection, recording_format, t0)
+
+        start = time.monotonic()
+        last_report = start
+        while not stop_event.wait(poll_ms / 1000):
+            for acq in acquisitions:
+                acq.drain()
+
+            now = time.monotonic()
+            if now - last_report >= 5:
+                print(f"{now - start:7.1f} s:",
+                      ", ".join(f"{acq.port} {len(acq)}" for acq in acquisitions))
+                last_report = now
+            if duration is not None and now - start >= duration:
+                break
+    finally:
+        for acq in acquisitions:
+            acq.close()
+            acq.finish(SaO2, HbO2)
+
+    if notes:
+        with open(prefix + '_Notes.txt', 'a') as f:
+            f.writelines(notes)
+    return prefix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless dye densitometer recorder")
+    parser.add_argument('--port', nargs='+', required=True,
+                        help="serial port(s), one per probe")
+    parser.add_argument('--patient', required=True, help="patient ID (eg. DH-xxx)")
+    parser.add_argument('--injection', required=True, help="injection ID (eg. ICG-xx)")
+    parser.add_argument('--sao2', default='0', help="SaO2 (decimal value)")
+    parser.add_argument('--hbo2', default='0', help="HbO2 (g/dL)")
+    parser.add_argument('--duration', type=float, default=None,
+                        help="seconds to record (default: until Ctrl+C/SIGTERM)")
+    parser.add_argument('--data-dir', default='Data')
+    parser.add_argument('--format', choices=('csv', 'bin'), default='csv')
+    parser.add_argument('--notes', default='')
+    parser.add_argument('--poll-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    # Ctrl+C and SIGTERM stop the recording cleanly, so the header is filled in
+    stop_event = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stop_event.set())
+
+    # rebuilds recordings left unfinished by a crash or power cut
+    recoverall(args.data_dir)
+
+    print("started", datetime.now())
+    prefix = acquire(args.port, args.patient, args.injection, args.sao2, args.hbo2,
+                     args.duration, args.data_dir, args.format, args.notes,
+                     args.poll_ms, stop_event)
+    print("recording saved to", prefix)
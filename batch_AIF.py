@@ -0,0 +1,228 @@
+"""
+Batch AIF reprocessing: runs TI_to_AIF headlessly on every recording under Data/.
+
+Each *_Volts.csv (or *_Volts.bin) is processed in its own worker process with
+the automatically selected heart rate, and the uncropped curve is written next
+to it as <recording>_AIF_batch.csv, so the _AIF.csv cropped by hand in the
+GUI is never touched. A manifest (batch_manifest.json) remembers the inputs
+and parameters each output was made from, so a rerun only processes new or
+changed recordings, and a summary table (batch_summary.csv) lists the heart
+rate, confidence and processing time of every recording. Recordings that still
+have a journal (being recorded, or waiting for RecordingJournal.recover) are
+listed as in-progress and left alone:
+
+    python batch_AIF.py Data --workers 4 --fs-target 30
+"""
+
+import argparse
+import contextlib
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from BinaryRecording import BinaryRecording
+from GUI_Vars import GUI_Vars
+from RecordingJournal import SUFFIX as JOURNAL_SUFFIX
+from TI_to_AIF import TI_to_AIF
+
+MANIFEST = 'batch_manifest.json'
+OUTPUT = '_AIF_batch.csv'  # AIF_Saving's _AIF.csv is the cropped one
+SUMMARY = 'batch_summary.csv'
+SUMMARY_FIELDS = ['recording', 'status', 'seconds', 'hr_bpm', 'confidence', 'fs',
+                  'samples', 'peak_uM', 'error']
+
+
+def findrecordings(data_dir: str) -> list:
+    """Finds the recordings under a data directory
+
+    Args:
+        data_dir (str): e.g. the Data folder
+
+    Returns:
+        list: _Volts files, the CSV when a recording has both formats
+    """
+    found = {}
+    for ext in ('.bin', '.csv'):
+        for filename in glob.glob(os.path.join(data_dir, '**', '*_Volts' + ext),
+                                  recursive=True):
+            found[filename[:-len('_Volts' + ext)]] = filename
+    return [found[prefix] for prefix in sorted(found)]
+
+
+def readheader(filename: str) -> tuple:
+    """SaO2 and HbO2 stored with a recording at Stop
+
+    Args:
+        filename (str): _Volts.csv or _Volts.bin file
+
+    Returns:
+        tuple: (SaO2, HbO2), 0 where not entered
+    """
+    if filename.endswith('.bin'):
+        recording = BinaryRecording(filename)
+        return recording.SaO2, recording.HbO2
+    values = []
+    with open(filename, 'r') as f:
+        for _ in range(2):
+            try:
+                values.append(float(f.readline().strip().strip(',')))
+            except ValueError:
+                values.append(0.0)
+    return tuple(values)
+
+
+def fingerprint(filename: str, params: dict) -> dict:
+    """What an output depends on: the recording, its clock sidecar and the parameters
+
+    Args:
+        filename (str): _Volts file
+        params (dict): TI_to_AIF parameters
+
+    Returns:
+        dict: sizes and modification times, and the parameters
+    """
+    inputs = {}
+    clockfile = filename.rsplit('_Volts', 1)[0] + '_Clock.csv'
+    for name in (filename, clockfile):
+        if os.path.exists(name):
+            st = os.stat(name)
+            inputs[os.path.basename(name)] = [st.st_size, st.st_mtime_ns]
+    return {'inputs': inputs, 'params': params}
+
+
+def process(filename: str, params: dict, current_dir: str, verbose: bool = False) -> dict:
+    """Computes and saves the AIF of one recording. Runs in a worker process.
+
+    Args:
+        filename (str): _Volts file
+        params (dict): wv, inv, filt_method, filt_phase, fs_target
+        current_dir (str): folder holding AIF_Processing
+        verbose (bool, optional): show TI_to_AIF's output. Defaults to False.
+
+    Returns:
+        dict: one summary row
+    """
+    prefix = filename.rsplit('_Volts', 1)[0]
+    row = {'recording': filename, 'status': 'ok'}
+    start = time.perf_counter()
+    try:
+        SaO2, HbO2 = readheader(filename)
+        gui_vars = GUI_Vars(None, None, None, prefix, None, current_dir, SaO2, HbO2)
+        ti = TI_to_AIF(filename, gui_vars, params['wv'], params['inv'],
+                       params['filt_method'], 0, filt_phase=params['filt_phase'],
+                       fs_target=params['fs_target'], headless=True)
+        with open(os.devnull, 'w') as devnull, \
+                (contextlib.nullcontext() if verbose else contextlib.redirect_stdout(devnull)):
+            t, Ca = ti.calculate_AIF()
+
+        with open(prefix + OUTPUT, 'w', newline='', encoding='utf-8') as csvfile:
+            csv.writer(csvfile).writerows(np.column_stack((t, Ca)).tolist())
+
+        row.update(hr_bpm=round(float(ti.x0), 3), confidence=round(ti.hr_confidence, 3),
+                   fs=round(float(ti.fs), 4), samples=len(t),
+                   peak_uM=round(float(np.max(Ca)), 4))
+        if ti.hr_confidence < params['min_confidence']:
+            row['status'] = 'check'
+    except Exception as e:
+        row.update(status='error', error='%s: %s' % (type(e).__name__, e))
+    row['seconds'] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def batch_AIF(data_dir: str = 'Data', workers: int = None, params: dict = None,
+              force: bool = False, verbose: bool = False) -> list:
+    """Processes every new or changed recording under data_dir in a process pool
+
+    Args:
+        data_dir (str, optional): folder searched recursively. Defaults to 'Data'.
+        workers (int, optional): worker processes. Defaults to the CPU count.
+        params (dict, optional): TI_to_AIF parameters, see process(). Defaults to
+            the GUI's ('upenn', causal, wavelengths 804/938, full rate).
+        force (bool, optional): reprocess unchanged recordings. Defaults to False.
+        verbose (bool, optional): show TI_to_AIF's output. Defaults to False.
+
+    Returns:
+        list: summary rows, also written to <data_dir>/batch_summary.csv
+    """
+    defaults = {'wv': [804, 938], 'inv': False, 'filt_method': 'upenn',
+                'filt_phase': 'causal', 'fs_target': None, 'min_confidence': 0.5}
+    params = dict(defaults, **(params or {}))
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+
+    manifest_file = os.path.join(data_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+
+    rows = []
+    todo = {}
+    for filename in findrecordings(data_dir):
+        key = os.path.relpath(filename, data_dir)
+        prefix = filename.rsplit('_Volts', 1)[0]
+        if os.path.exists(filename + JOURNAL_SUFFIX):
+            # truncated file with placeholder SaO2/HbO2 until closed or recovered
+            rows.append({'recording': filename, 'status': 'in-progress'})
+            manifest.pop(key, None)
+            print("in-progress (journal present):", filename)
+            continue
+        if (not force and os.path.exists(prefix + OUTPUT)
+                and manifest.get(key) == fingerprint(filename, params)):
+            rows.append({'recording': filename, 'status': 'unchanged'})
+            continue
+        todo[key] = filename
+
+    print(len(todo), "recording(s) to process,", len(rows), "skipped")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process, filename, params, current_dir, verbose): key
+                   for key, filename in todo.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            row = future.result()
+            rows.append(row)
+            print("%-8s %7.2f s  %s" % (row['status'], row['seconds'], row['recording']))
+            if row['status'] == 'error':
+                print("        ", row['error'])
+                manifest.pop(key, None)
+            else:
+                manifest[key] = fingerprint(todo[key], params)
+    print("processed in %.1f s" % (time.perf_counter() - start))
+
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    rows.sort(key=lambda row: row['recording'])
+    with open(os.path.join(data_dir, SUMMARY), 'w', newline='') as f:
+        writer = csv.DictWriter(f, SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reprocess every recording's AIF")
+    parser.add_argument('data_dir', nargs='?', default='Data')
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument('--wv', type=float, nargs=2, default=[804, 938],
+                        help="probe LED wavelengths (nm)")
+    parser.add_argument('--inv', action='store_true', help="swap RED and IR")
+    parser.add_argument('--filt-method', choices=('upenn', 'simple'), default='upenn')
+    parser.add_argument('--filt-phase', choices=('causal', 'compensated', 'zerophase'),
+                        default='causal')
+    parser.add_argument('--fs-target', type=float, default=None,
+                        help="decimate to about this rate before filtering (Hz)")
+    parser.add_argument('--min-confidence', type=float, default=0.5,
+                        help="flag heart rates picked with less confidence")
+    parser.add_argument('--force', action='store_true', help="reprocess unchanged recordings")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    params = {'wv': args.wv, 'inv': args.inv, 'filt_method': args.filt_method,
+              'filt_phase': args.filt_phase, 'fs_target': args.fs_target,
+              'min_confidence': args.min_confidence}
+    rows = batch_AIF(args.data_dir, args.workers, params, args.force, args.verbose)
+    print("summary written to", os.path.join(args.data_dir, SUMMARY))
@@ -0,0 +1,185 @@
+"""
+Acquisition throughput and drop-rate benchmark.
+
+Drives the acquisition path (SerialReader -> ring buffer -> SampleStore, the
+same drain the GUI does every poll_ms) from a VirtualDensitometer on a local
+pty at increasing sample rates and writes a JSON report to
+benchmarks/results/:
+
+    python benchmarks/bench_acquisition.py --rates 300 3000 30000 --protocol binary
+
+Latency is measured from the moment the emulator sends a sample to the moment
+the consumer pops it from the ring buffer. It is exact for the binary
+protocol (frames carry the device sample counter); for ASCII it assumes the
+n-th parsed line is the n-th line sent and is left out when lines are lost.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SampleStore import SampleStore  # noqa: E402
+from SerialReader import SerialReader  # noqa: E402
+from VirtualDensitometer import VirtualDensitometer  # noqa: E402
+
+# where the benchmarks write their reports by default (ignored by git)
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def run_rate(rate: float, protocol: str, duration: float, malformed: float,
+             poll_ms: float) -> dict:
+    """Runs the acquisition path at one sample rate
+
+    Args:
+        rate (float): emulated samples per second
+        protocol (str): 'ascii' or 'binary'
+        duration (float): seconds to acquire
+        malformed (float): fraction of malformed ASCII lines
+        poll_ms (float): consumer polling interval, as in SerialPlotting
+
+    Returns:
+        dict: results for this rate
+    """
+    device = VirtualDensitometer(rate=rate, protocol=protocol, malformed=malformed,
+                                 bolus_time=None, seed=0)
+
+    # emulator send log: first sample number and host time of every batch
+    sends = []
+    device.on_send = lambda first, n, t: sends.append((first, t))
+
+    reader = SerialReader(device.port, protocol=protocol)
+    store = SampleStore(['RED', 'IR', 'REDamb', 'IRamb', 'ts', 'seq'])
+    latencies = []
+
+    def drain():
+        rows = reader.ring.pop()
+        if len(rows) == 0:
+            return
+        now = time.perf_counter()
+        store.append(rows)
+        if sends:
+            log = np.array(sends)
+            # binary frames carry the device counter; ASCII rows carry the
+            # 1-based parsed count
+            seq = rows[:, 5] if reader.protocol == 'binary' else rows[:, 5] - 1
+            batch = np.searchsorted(log[:, 0], seq, side='right') - 1
+            latencies.append(now - log[np.maximum(batch, 0), 1])
+
+    reader.start()
+    device.start()
+    cpu0 = time.process_time()
+    thread0 = time.thread_time()
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < duration:
+        time.sleep(poll_ms / 1000)
+        drain()
+    device.stop()
+    elapsed = time.perf_counter() - t0
+
+    # let the reader empty the pty before stopping it
+    time.sleep(0.3)
+    reader.stop()
+    drain()
+    consumer_cpu = time.thread_time() - thread0
+    process_cpu = time.process_time() - cpu0
+    device.close()
+
+    received = len(store)
+    lost = device.sent - received
+    exact = protocol == 'binary' or (reader.skipped == 0 and lost == 0)
+    lat = np.concatenate(latencies) * 1000 if latencies and exact else None
+
+    return {
+        'rate_hz': rate,
+        'protocol': protocol,
+        'duration_s': elapsed,
+        'samples_sent': device.sent,
+        'samples_received': received,
+        'sustained_samples_per_s': received / elapsed,
+        'loss_rate': lost / device.sent if device.sent else 0,
+        'parse_errors': reader.skipped,
+        'parse_error_rate': reader.skipped / max(1, received + reader.skipped),
+        'dropped_sequence': reader.dropped if protocol == 'binary' else None,
+        'pty_overflows': device.overflowed,
+        'ring_overflows': reader.ring.overflows,
+        'latency_ms': None if lat is None else {
+            'p50': float(np.percentile(lat, 50)),
+            'p90': float(np.percentile(lat, 90)),
+            'p99': float(np.percentile(lat, 99)),
+            'max': float(np.max(lat))},
+        'reader_cpu_us_per_sample': 1e6 * reader.cpu_time / max(1, received),
+        'consumer_cpu_us_per_sample': 1e6 * consumer_cpu / max(1, received),
+        # includes the emulator thread, so it is an upper bound
+        'process_cpu_us_per_sample': 1e6 * process_cpu / max(1, received),
+        'sustained': lost <= 0.001 * device.sent and reader.ring.overflows == 0,
+    }
+
+
+def version() -> str:
+    """
+    Returns the git commit of the tree being benchmarked, if available
+    """
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def writereport(report: dict, filename: str):
+    """Writes a benchmark report as JSON, creating its folder if needed
+
+    Args:
+        report (dict): benchmark results
+        filename (str): output file, e.g. under RESULTS
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("report written to", filename)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Acquisition throughput benchmark")
+    parser.add_argument('--rates', type=float, nargs='+',
+                        default=[300, 1000, 3000, 10000, 30000, 100000])
+    parser.add_argument('--protocol', choices=('ascii', 'binary'), nargs='+',
+                        default=['ascii', 'binary'])
+    parser.add_argument('--duration', type=float, default=5, help="seconds per rate")
+    parser.add_argument('--malformed', type=float, default=0,
+                        help="fraction of malformed ASCII lines")
+    parser.add_argument('--poll-ms', type=float, default=20,
+                        help="consumer polling interval")
+    parser.add_argument('--output', default=os.path.join(RESULTS, 'bench_acquisition.json'))
+    args = parser.parse_args()
+
+    results = []
+    for protocol in args.protocol:
+        for rate in args.rates:
+            r = run_rate(rate, protocol, args.duration, args.malformed, args.poll_ms)
+            results.append(r)
+            lat = r['latency_ms']
+            print(f"{protocol:6s} {rate:9.0f} Hz: {r['sustained_samples_per_s']:10.0f} samples/s,"
+                  f" loss {100 * r['loss_rate']:6.2f} %, parse errors {r['parse_errors']},"
+                  f" p99 latency {lat['p99'] if lat else float('nan'):7.1f} ms,"
+                  f" reader {r['reader_cpu_us_per_sample']:6.2f} us/sample")
+
+    report = {
+        'version': version(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'args': vars(args),
+        'results': results,
+    }
+    writereport(report, args.output)
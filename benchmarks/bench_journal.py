@@ -0,0 +1,105 @@
+"""
+Write-ahead journal overhead benchmark.
+
+Writes the same synthetic recording through RecordingWriter with and without
+the crash-recovery journal (see RecordingJournal) and reports the write
+throughput and the journal's overhead:
+
+    python benchmarks/bench_journal.py --rows 2000000 --block 5000
+
+Blocks are written one per flush, as the writer thread does every flush_s
+at run time, so the journal is fsynced at its normal once-a-second cadence.
+"""
+
+import argparse
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from RecordingWriter import RecordingWriter  # noqa: E402
+from bench_acquisition import RESULTS, version, writereport  # noqa: E402
+
+FIELDS = ['Ch : RED', 'Ch : RED AMBIENT', 'Ch : IR', 'Ch: IR AMBIENT',
+          'Ch : RED - RED AMBIENT', 'Ch : IR - IR AMBIENT', 'Timestamp']
+
+
+def run_case(directory: str, recording_format: str, journal: bool, rows: int,
+             block: int) -> dict:
+    """Writes one recording and times it
+
+    Args:
+        directory (str): where to write
+        recording_format (str): 'csv' or 'bin'
+        journal (bool): keep the crash-recovery journal
+        rows (int): samples to write
+        block (int): samples per write
+
+    Returns:
+        dict: results for this case
+    """
+    rng = np.random.default_rng(0)
+    data = rng.random((rows, 7))
+    data[:, 6] = np.arange(rows) / 300
+
+    filename = os.path.join(directory, f'bench_{int(journal)}_Volts.{recording_format}')
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    writer = RecordingWriter(filename, FIELDS, journal=journal)
+    for i in range(0, rows, block):
+        writer.append(data[i:i + block])
+        writer._write_pending()
+    writer.finalize('0.98', '14')
+    elapsed = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+    size = os.path.getsize(filename)
+    os.remove(filename)
+
+    return {
+        'format': recording_format,
+        'journal': journal,
+        'rows': rows,
+        'block_rows': block,
+        'elapsed_s': elapsed,
+        'rows_per_s': rows / elapsed,
+        'cpu_us_per_row': 1e6 * cpu / rows,
+        'file_bytes': size,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recording journal overhead benchmark")
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--block', type=int, default=5000,
+                        help="rows per write (RecordingWriter flush_rows)")
+    parser.add_argument('--format', choices=('csv', 'bin'), nargs='+',
+                        default=['csv', 'bin'])
+    parser.add_argument('--dir', default=None, help="directory to write in")
+    parser.add_argument('--output', default=os.path.join(RESULTS, 'bench_journal.json'))
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for recording_format in args.format:
+            plain = run_case(directory, recording_format, False, args.rows, args.block)
+            journaled = run_case(directory, recording_format, True, args.rows, args.block)
+            overhead = journaled['elapsed_s'] / plain['elapsed_s'] - 1
+            results += [plain, journaled]
+            print(f"{recording_format}: {plain['rows_per_s']:10.0f} rows/s without journal,"
+                  f" {journaled['rows_per_s']:10.0f} rows/s with journal"
+                  f" ({100 * overhead:+.1f} %)")
+
+    report = {
+        'version': version(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'args': vars(args),
+        'results': results,
+    }
+    writereport(report, args.output)
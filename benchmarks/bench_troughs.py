@@ -0,0 +1,134 @@
+"""
+Peak/trough extraction benchmark for TI_to_AIF.filter_signal.
+
+Times the original per-beat Python loop (kept here as the reference) against
+the segment reduction in findtroughs on synthetic recordings, checks that
+both give the same troughs, and writes a JSON report to
+benchmarks/results/:
+
+    python benchmarks/bench_troughs.py --minutes 30
+"""
+
+import argparse
+import os
+import platform
+import sys
+import time
+import numpy as np
+from scipy import signal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from findtroughs import findtroughs  # noqa: E402
+from VirtualDensitometer import VirtualDensitometer  # noqa: E402
+from bench_acquisition import RESULTS, version, writereport  # noqa: E402
+
+
+def legacy(fIR, locsir, fs):
+    """
+    The loop filter_signal used before findtroughs, for reference
+    """
+    pksir = np.array([fIR[i] for i in locsir])
+    tir = np.zeros((1, len(locsir) - 1))
+    minir = np.zeros((1, len(locsir) - 1))
+    locsirmin = np.zeros((1, len(locsir) - 1))
+    pksir = pksir[0:len(pksir) - 1].T
+    tmpt = np.array([i / fs for i in range(1, len(fIR) + 1)])
+    for k in range(len(locsir) - 1):
+        tir[0, k] = np.mean(tmpt[locsir[k]:locsir[k+1]])
+        locsir_sublist = np.array(fIR[locsir[k]:locsir[k+1]])
+        minir[0, k] = locsir_sublist.min()
+        loctmp = np.where(locsir_sublist == minir[0, k])[0][0]
+        locsirmin[0, k] = locsir[k] + loctmp - 1
+    return pksir, tmpt, tir, minir, locsirmin
+
+
+def vectorized(fIR, locsir, fs):
+    """
+    What filter_signal does now
+    """
+    pksir = np.asarray(fIR)[locsir]
+    pksir = pksir[0:len(pksir) - 1].T
+    tmpt = np.arange(1, len(fIR) + 1) / fs
+    tir, minir, locsirmin = findtroughs(fIR, locsir, tmpt)
+    return pksir, tmpt, tir, minir, locsirmin
+
+
+def best_of(func, repeat, *args):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+
+def run_case(minutes: float, fs: float, hr: float, repeat: int) -> dict:
+    """Builds a filtered IR signal of the given length and times both versions
+
+    Args:
+        minutes (float): recording length
+        fs (float): sample rate (Hz)
+        hr (float): heart rate (bpm)
+        repeat (int): timing repeats (best is reported)
+
+    Returns:
+        dict: results for this length
+    """
+    device = VirtualDensitometer(rate=fs, hr=hr, seed=0)
+    device.close()
+    seq = np.arange(int(minutes * 60 * fs))
+    values = device.samples(seq)
+
+    # stands in for the remez band-pass around the heart rate
+    fhr = hr / 60
+    sos = signal.butter(4, [0.9 * fhr, 1.1 * fhr], 'bandpass', fs=fs, output='sos')
+    fIR = signal.sosfilt(sos, -np.log(values[:, 1] - values[:, 3]))
+    locsir, _ = signal.find_peaks(fIR, distance=round((0.5 / fhr) * fs))
+
+    t_old, old = best_of(legacy, repeat, fIR, locsir, fs)
+    t_new, new = best_of(vectorized, repeat, fIR, locsir, fs)
+
+    names = ('pksir', 'tmpt', 'tir', 'minir', 'locsirmin')
+    return {
+        'minutes': minutes,
+        'samples': len(fIR),
+        'beats': len(locsir) - 1,
+        'loop_s': t_old,
+        'vectorized_s': t_new,
+        'speedup': t_old / t_new,
+        # tir is a closed-form mean, so it can differ in the last bits
+        'max_abs_diff': {name: float(np.max(np.abs(a - b)))
+                         for name, a, b in zip(names, old, new)},
+        'identical': {name: bool(np.array_equal(a, b))
+                      for name, a, b in zip(names, old, new)},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak/trough extraction benchmark")
+    parser.add_argument('--minutes', type=float, nargs='+', default=[1, 5, 30])
+    parser.add_argument('--fs', type=float, default=300)
+    parser.add_argument('--hr', type=float, default=72)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=os.path.join(RESULTS, 'bench_troughs.json'))
+    args = parser.parse_args()
+
+    results = []
+    for minutes in args.minutes:
+        r = run_case(minutes, args.fs, args.hr, args.repeat)
+        results.append(r)
+        print(f"{minutes:5.0f} min, {r['beats']:6d} beats: loop {1000 * r['loop_s']:8.1f} ms,"
+              f" vectorized {1000 * r['vectorized_s']:7.2f} ms ({r['speedup']:.0f}x),"
+              f" max |diff| tir {r['max_abs_diff']['tir']:.1e}")
+
+    report = {
+        'version': version(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'args': vars(args),
+        'results': results,
+    }
+    writereport(report, args.output)
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+def estimatefs(ts: np.ndarray, gap_factor: float = 5) -> dict:
+    """Estimates the sample rate of a recording from its timestamp column
+
+    The rate is the slope of a least squares fit of timestamp against sample
+    number. Gaps (lost samples, paused acquisition) split the series into
+    segments that share the slope but each get their own offset, so a gap does
+    not bias the rate. Works for per-sample timestamps and for older recordings
+    where every sample of a read carries the read time.
+
+    Args:
+        ts (ndarray): timestamps (s), one per sample
+        gap_factor (float, optional): an interval longer than gap_factor times
+            the median interval (and at least 5 sample periods) is a gap.
+            Defaults to 5.
+
+    Returns:
+        dict: fs (Hz, fractional), fs_median (Hz, from the median positive
+            interval), jitter (s, robust standard deviation of timestamps
+            around the fit), gaps ((k, 2) array of sample index after which a
+            gap starts and its length in s), backwards (number of intervals
+            where the timestamp went back), n (samples)
+    """
+    ts = np.asarray(ts, dtype=np.float64)
+    n = len(ts)
+    result = {'fs': None, 'fs_median': None, 'jitter': None,
+              'gaps': np.empty((0, 2)), 'backwards': 0, 'n': n}
+    if n < 3 or ts[-1] <= ts[0]:
+        return result
+
+    dt = np.diff(ts)
+    positive = dt[dt > 0]
+    dt_median = np.median(positive) if len(positive) else 0
+    result['fs_median'] = float(1 / dt_median) if dt_median > 0 else None
+    result['backwards'] = int(np.count_nonzero(dt < 0))
+
+    # first guess over the whole series, used to scale the gap threshold
+    fs = (n - 1) / (ts[-1] - ts[0])
+    gap = np.flatnonzero(dt > max(gap_factor * dt_median, 5 / fs))
+
+    # common slope with one intercept per gap-free segment
+    starts = np.concatenate(([0], gap + 1))
+    lengths = np.diff(np.concatenate((starts, [n])))
+    idx = np.arange(n, dtype=np.float64)
+    idx_mean = np.repeat(np.add.reduceat(idx, starts) / lengths, lengths)
+    ts_mean = np.repeat(np.add.reduceat(ts, starts) / lengths, lengths)
+    x = idx - idx_mean
+    y = ts - ts_mean
+    sxx = np.dot(x, x)
+    if sxx > 0:
+        slope = np.dot(x, y) / sxx
+        if slope > 0:
+            fs = 1 / slope
+            resid = y - slope * x
+            result['jitter'] = float(1.4826 * np.median(np.abs(resid - np.median(resid))))
+    result['fs'] = float(fs)
+    result['gaps'] = np.column_stack((gap, dt[gap] - 1 / fs))
+    return result
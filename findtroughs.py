@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def findtroughs(fIR: np.ndarray, locsir: np.ndarray, tmpt: np.ndarray) -> tuple:
+    """Finds the trough between each pair of consecutive IR peaks
+
+    Each beat is the segment fIR[locsir[k]:locsir[k+1]]. All segments are
+    reduced at once with ufunc.reduceat over the beat boundaries, so the cost
+    is a few passes over the signal instead of a Python loop per beat.
+
+    Args:
+        fIR (ndarray): filtered IR signal
+        locsir (ndarray): peak indices, increasing
+        tmpt (ndarray): time of every sample (s)
+
+    Returns:
+        tuple: (tir, minir, locsirmin), each shaped (1, len(locsir) - 1):
+            mean time of each beat, trough value, and the index of the first
+            sample at the trough minus one (as the original MATLAB port did)
+    """
+    locsir = np.asarray(locsir, dtype=np.int64)
+    starts = locsir[:-1]
+    stops = locsir[1:]
+
+    # beats cover fIR[locsir[0]:locsir[-1]] with no gaps between them
+    beats = fIR[starts[0]:stops[-1]]
+    offsets = starts - starts[0]
+    minir = np.minimum.reduceat(beats, offsets)
+
+    # first sample of each beat that equals its minimum
+    idx = np.arange(len(beats))
+    at_min = beats == np.repeat(minir, stops - starts)
+    first = np.minimum.reduceat(np.where(at_min, idx, len(beats)), offsets)
+    locsirmin = (starts[0] + first - 1).astype(np.float64)
+
+    # tmpt is evenly spaced, so the mean over a beat is the mean of its ends
+    tir = 0.5 * (tmpt[starts] + tmpt[stops - 1])
+
+    return tir.reshape(1, -1), minir.reshape(1, -1), locsirmin.reshape(1, -1)
@@ -19,22 +19,27 @@ class o_loadAIF:
         """
         self.xvals = []
 
-    def save_AIF_file(self, gui_vars):
+    def save_AIF_file(self, gui_vars, streamed=None):
         """Finds filename for AIF file and calls AIF calculation functions
 
         Args:
             gui_vars (GUI_vars): GUI variables that need to be passed through several function calls
+            streamed (tuple, optional): (hr, confidence, t, Ca) computed while
+                recording (see StreamingAIF). Its heart rate is proposed on the
+                PSD and its AIF used if accepted. Defaults to None.
         """
+        # absolute path of the recording without suffix
         dir = gui_vars.dir
 
         # file was found with 'Volts' in it.
-        path = os.path.normpath(dir)
-        path_split = path.split(os.sep)
-        filename = path_split[-1] + '_Volts.csv'
+        filename = dir + '_Volts.csv'
+        if not os.path.exists(filename) and os.path.exists(dir + '_Volts.bin'):
+            filename = dir + '_Volts.bin'
 
         wv = [804, 938]  # wavelength of probe LEDs.
 
         # Calculate and save AIF
         filt_method = 'upenn'  # upenn is best, simple is faster.
-        t = TI_to_AIF(filename, gui_vars, wv, False, filt_method, 0)
+        t = TI_to_AIF(filename, gui_vars, wv, False, filt_method, 0,
+                      streamed=streamed)
         t.calculate_AIF()
@@ -0,0 +1,91 @@
+import numpy as np
+
+# bytes allowed in a well formed 'RED,IR,REDamb,IRamb\r\n' line
+_ALLOWED = np.zeros(256, dtype=bool)
+_ALLOWED[np.frombuffer(b'0123456789.-+eE, \r\n', dtype=np.uint8)] = True
+
+_COMMA = ord(',')
+_CR = ord('\r')
+_LF = ord('\n')
+
+
+def parselines(buf: bytes, ncols: int = 4) -> tuple:
+    """Parses every complete line in a chunk of serial data at once
+
+    Lines are validated with array operations (field count, allowed characters,
+    empty fields) and all valid lines are converted to floats in a single call,
+    so the cost per sample does not involve any Python-level work.
+
+    Args:
+        buf (bytes): raw bytes read from the serial port
+        ncols (int, optional): number of comma separated values per line. Defaults to 4.
+
+    Returns:
+        tuple: (values, remainder, nbad) where values is an (n, ncols) float64
+            ndarray, remainder holds the trailing partial line to prepend to the
+            next chunk and nbad is the number of malformed lines dropped
+    """
+    end = buf.rfind(b'\n')
+    if end < 0:
+        return np.empty((0, ncols)), buf, 0
+    remainder = buf[end + 1:]
+
+    raw = np.frombuffer(buf, dtype=np.uint8, count=end + 1)
+    ends = np.flatnonzero(raw == _LF)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+
+    # per-line statistics using segment sums over the byte stream
+    is_comma = raw == _COMMA
+    # a comma followed by another separator, or a line starting with one,
+    # means an empty field
+    empty = np.zeros(len(raw), dtype=bool)
+    empty[:-1] = is_comma[:-1] & ((raw[1:] == _COMMA) | (raw[1:] == _CR) |
+                                  (raw[1:] == _LF))
+    empty[starts] |= is_comma[starts]
+
+    ncommas = np.add.reduceat(is_comma, starts)
+    nillegal = np.add.reduceat(~_ALLOWED[raw], starts)
+    nempty = np.add.reduceat(empty, starts)
+    good = (ncommas == ncols - 1) & (nillegal == 0) & (nempty == 0)
+    nbad = int(np.count_nonzero(~good))
+    ngood = len(good) - nbad
+    if ngood == 0:
+        return np.empty((0, ncols)), remainder, nbad
+
+    # keep the bytes of good lines, drop '\r' and turn line ends into commas
+    keep = np.repeat(good, ends - starts + 1) & (raw != _CR)
+    text = raw[keep]
+    text[text == _LF] = _COMMA
+    try:
+        values = np.fromstring(text[:-1].tobytes(), dtype=np.float64, sep=',')
+    except ValueError:
+        values = np.empty(0)
+
+    if len(values) != ngood * ncols:
+        # something like '1.2.3' slipped through the byte checks: fall back to
+        # converting the candidate lines one at a time
+        values, nfail = _parse_slow(text[:-1].tobytes(), ncols)
+        nbad += nfail
+
+    return values.reshape(-1, ncols), remainder, nbad
+
+
+def _parse_slow(text: bytes, ncols: int) -> tuple:
+    """Converts comma separated fields line by line, dropping lines that fail
+
+    Args:
+        text (bytes): fields of candidate lines joined with commas
+        ncols (int): number of values per line
+
+    Returns:
+        tuple: (values, nfail) flat float64 ndarray and number of dropped lines
+    """
+    fields = text.split(b',')
+    rows = []
+    nfail = 0
+    for i in range(0, len(fields), ncols):
+        try:
+            rows.append([float(v) for v in fields[i:i + ncols]])
+        except ValueError:
+            nfail += 1
+    return np.array(rows, dtype=np.float64).reshape(-1), nfail
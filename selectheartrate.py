@@ -0,0 +1,73 @@
+import numpy as np
+from scipy import signal
+
+
+def selectheartrate(f: np.ndarray, P: np.ndarray, band: tuple = (40, 200),
+                    x: np.ndarray = None, fs: float = None) -> tuple:
+    """Picks the heart-rate peak from the Welch PSD of the RED and IR channels
+
+    Each channel's spectrum is normalised by its power in the physiological
+    band and the two are averaged, so a peak present in both wins over noise
+    in one. The peak bin is refined between bins by parabolic interpolation
+    of the log spectrum, or, when the time series x is given, by a zoom FFT
+    around it at 100 times the Welch resolution.
+
+    The confidence (0 to 1) is the share of the band power within two bins of
+    the peak, scaled down when the channels' own peaks disagree by more than
+    two bins.
+
+    Args:
+        f (ndarray): PSD frequencies (Hz)
+        P (ndarray): (channels, len(f)) PSD, e.g. RED and IR
+        band (tuple, optional): heart rates searched (bpm). Defaults to (40, 200).
+        x (ndarray, optional): (channels, n) signals the PSD came from, for the
+            zoom FFT refinement. Defaults to None.
+        fs (float, optional): sampling rate of x. Defaults to None.
+
+    Raises:
+        ValueError: fewer than 3 PSD bins in the band (recording too short) or
+            no power in it (flat signal)
+
+    Returns:
+        tuple: (heart rate in bpm, confidence)
+    """
+    P = np.atleast_2d(P)
+    inband = np.flatnonzero((f >= band[0] / 60) & (f <= band[1] / 60))
+    if len(inband) < 3:
+        raise ValueError("Too few PSD bins in the heart-rate band")
+    df = f[1] - f[0]
+
+    power = P[:, inband].sum(axis=1, keepdims=True)
+    if not np.all(np.isfinite(power)) or np.any(power <= 0):
+        raise ValueError("No power in the heart-rate band")
+    norm = P[:, inband] / power
+    S = norm.mean(axis=0)
+    k = int(np.argmax(S))
+
+    # parabolic interpolation of the log peak between bins
+    shift = 0.0
+    if 0 < k < len(S) - 1:
+        a, b, c = np.log(S[k - 1:k + 2] + 1e-300)
+        if a - 2 * b + c < 0:
+            shift = 0.5 * (a - c) / (a - 2 * b + c)
+    fhr = f[inband[k]] + shift * df
+
+    if x is not None and fs is not None:
+        # zoom FFT over +-1 Welch bin around the peak
+        x = np.atleast_2d(x)
+        m = 201
+        fz = np.linspace(fhr - df, fhr + df, m)
+        win = signal.get_window('hann', x.shape[1])
+        xz = (x - x.mean(axis=1, keepdims=True)) * win
+        Z = np.abs(signal.zoom_fft(xz, [fz[0], fz[-1] + (fz[1] - fz[0])], m=m,
+                                   fs=fs, endpoint=False, axis=-1)) ** 2
+        Z /= Z.sum(axis=1, keepdims=True)
+        fhr = fz[int(np.argmax(Z.mean(axis=0)))]
+
+    # how much of the band power sits at the peak, and whether channels agree
+    near = np.abs(np.arange(len(S)) - k) <= 2
+    concentration = S[near].sum()
+    peaks = np.argmax(norm, axis=1)
+    spread = peaks.max() - peaks.min()
+    agreement = 1.0 if spread <= 2 else 2.0 / spread
+    return float(60 * fhr), float(min(1.0, concentration) * agreement)
@@ -0,0 +1,63 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Acquisition import Acquisition  # noqa: E402
+from BinaryRecording import BinaryRecording, binary_to_csv, csv_to_binary  # noqa: E402
+from RecordingWriter import RecordingWriter  # noqa: E402
+
+ROWS = 10000  # two full 4096-row chunks and a partial one
+
+
+def record(filename, blocks):
+    writer = RecordingWriter(filename, Acquisition.FIELDS, patient='DH-001',
+                             injection='ICG-01')
+    for block in blocks:
+        writer.append(block)
+    writer.finalize('0.97', '13.5')
+
+
+def readcsv(filename):
+    with open(filename, 'r') as f:
+        SaO2 = float(f.readline().strip().strip(','))
+        HbO2 = float(f.readline().strip().strip(','))
+    return SaO2, HbO2, np.loadtxt(filename, skiprows=3, delimiter=',', ndmin=2)
+
+
+def test_binary_recording_matches_csv(tmp_path):
+    rng = np.random.default_rng(0)
+    data = rng.normal(1, 0.1, (ROWS + RecordingWriter.ISTART, 7))
+    data[:, 6] = 1000 + np.arange(len(data)) / 300
+    blocks = np.array_split(data, 37)
+    record(str(tmp_path / 'rec_Volts.csv'), blocks)
+    record(str(tmp_path / 'rec_Volts.bin'), blocks)
+
+    SaO2, HbO2, X = readcsv(str(tmp_path / 'rec_Volts.csv'))
+    assert (SaO2, HbO2) == (0.97, 13.5)
+    assert X.shape == (ROWS, 7)
+
+    rec = BinaryRecording(str(tmp_path / 'rec_Volts.bin'))
+    assert len(rec) == ROWS
+    assert (rec.SaO2, rec.HbO2) == (0.97, 13.5)
+    assert (rec.patient, rec.injection) == ('DH-001', 'ICG-01')
+    assert rec.channels == Acquisition.FIELDS
+    np.testing.assert_allclose(rec.fs, 300, rtol=1e-9)
+    np.testing.assert_array_equal(rec.toarray(), X)
+    np.testing.assert_array_equal(rec.column('Timestamp'), X[:, 6])
+
+
+def test_converters_round_trip(tmp_path):
+    data = np.random.default_rng(1).normal(1, 0.1, (ROWS + RecordingWriter.ISTART, 7))
+    record(str(tmp_path / 'rec_Volts.csv'), [data])
+    SaO2, HbO2, X = readcsv(str(tmp_path / 'rec_Volts.csv'))
+
+    csv_to_binary(str(tmp_path / 'rec_Volts.csv'), str(tmp_path / 'conv.bin'))
+    rec = BinaryRecording(str(tmp_path / 'conv.bin'))
+    assert (rec.SaO2, rec.HbO2) == (SaO2, HbO2)
+    np.testing.assert_array_equal(rec.toarray(), X)
+
+    binary_to_csv(str(tmp_path / 'conv.bin'), str(tmp_path / 'back.csv'))
+    assert readcsv(str(tmp_path / 'back.csv'))[:2] == (SaO2, HbO2)
+    np.testing.assert_array_equal(readcsv(str(tmp_path / 'back.csv'))[2], X)
@@ -0,0 +1,25 @@
+import os
+import sys
+import types
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TI_to_AIF import TI_to_AIF  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_decimate_keeps_the_edges():
+    fs = 300
+    t = np.arange(60 * fs) / fs
+    RED = 2.0 + 0.01 * np.sin(2 * np.pi * 1.2 * t)
+    IR = 2.5 + 0.02 * np.sin(2 * np.pi * 1.2 * t)
+    gui_vars = types.SimpleNamespace(current_dir=REPO)
+    ti = TI_to_AIF('', gui_vars, [804, 938], fs_target=30, headless=True)
+
+    dRED, dIR, fs_eff = ti.decimate(RED, IR, fs)
+    assert fs_eff == 30
+    # no transient at either end once the log is taken
+    assert np.ptp(-np.log(dRED)) < 1.1 * np.ptp(-np.log(RED))
+    assert np.ptp(-np.log(dIR)) < 1.1 * np.ptp(-np.log(IR))
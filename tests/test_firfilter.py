@@ -0,0 +1,36 @@
+import os
+import sys
+import numpy as np
+import pytest
+from scipy import signal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firfilter import firfilter  # noqa: E402
+
+FS = 300
+TAPS = signal.firwin(301, [0.5, 5], fs=FS, pass_zero=False)  # linear phase band-pass
+X = np.random.default_rng(0).standard_normal((2, 20 * FS))
+
+
+@pytest.mark.parametrize('method, workers', [('fft', 1), ('fft', 2), ('direct', 1)])
+def test_causal_matches_lfilter(method, workers):
+    y = firfilter(TAPS, X, 'causal', method, workers)
+    np.testing.assert_allclose(y, signal.lfilter(TAPS, 1, X, axis=1), rtol=0, atol=1e-12)
+    np.testing.assert_allclose(firfilter(TAPS, X[0], 'causal', method), y[0],
+                               rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('method', ['fft', 'direct'])
+def test_compensated_is_causal_shifted_by_the_group_delay(method):
+    delay = (len(TAPS) - 1) // 2
+    causal = firfilter(TAPS, X, 'causal', method)
+    y = firfilter(TAPS, X, 'compensated', method)
+    assert y.shape == X.shape
+    np.testing.assert_allclose(y[:, :-delay], causal[:, delay:], rtol=0, atol=1e-12)
+
+
+def test_zerophase_has_no_direction():
+    y = firfilter(TAPS, X, 'zerophase')
+    np.testing.assert_allclose(firfilter(TAPS, X[:, ::-1], 'zerophase')[:, ::-1], y,
+                               rtol=0, atol=1e-12)
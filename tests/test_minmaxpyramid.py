@@ -0,0 +1,49 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from MinMaxPyramid import MinMaxPyramid  # noqa: E402
+
+
+def grown(raw, seed=0):
+    """Pyramid of raw, fed in uneven chunks as the acquisition does"""
+    rng = np.random.default_rng(seed)
+    n = 0
+    pyramid = MinMaxPyramid(lambda: raw[:n])
+    while n < len(raw):
+        n = min(len(raw), n + int(rng.integers(1, 700)))
+        pyramid.update()
+    return pyramid
+
+
+def test_envelope_matches_brute_force_blocks():
+    raw = np.random.default_rng(1).normal(size=100003)
+    pyramid = grown(raw)
+
+    for start, stop, max_points in ((0, len(raw), 2000), (1234, 98765, 500),
+                                    (77, 5000, 100), (10, 60, 100)):
+        idx, y = pyramid.query(start, stop, max_points)
+        level = 0
+        while (level < len(pyramid.levels) and
+               (stop - start) / 8 ** level > max_points):
+            level += 1
+        if level == 0:
+            np.testing.assert_array_equal(idx, np.arange(start, stop))
+            np.testing.assert_array_equal(y, raw[start:stop])
+            continue
+
+        # level blocks are whole multiples of size: the last partial one
+        # and anything after it come from the raw data
+        size = 8 ** level
+        edges = np.arange(start // size * size, min(stop, len(raw) // size * size), size)
+        mins = np.minimum.reduceat(raw[:edges[-1] + size], edges)
+        maxs = np.maximum.reduceat(raw[:edges[-1] + size], edges)
+        nb = len(edges)
+        np.testing.assert_array_equal(idx[:2 * nb:2], edges + size // 2)
+        np.testing.assert_array_equal(y[:2 * nb:2], mins)
+        np.testing.assert_array_equal(y[1:2 * nb:2], maxs)
+        np.testing.assert_array_equal(idx[2 * nb:], np.arange(max(edges[-1] + size, start), stop))
+        np.testing.assert_array_equal(y[2 * nb:], raw[idx[2 * nb:]])
+        assert y.min() <= raw[start:stop].min() and y.max() >= raw[start:stop].max()
@@ -0,0 +1,56 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parseframes import FRAME_SIZE, packframes, parseframes  # noqa: E402
+from SampleClock import SampleClock  # noqa: E402
+
+VALUES = np.arange(20, dtype=np.float64).reshape(5, 4) / 8  # exact in float32
+SEQ = np.arange(100, 105)
+
+
+def test_resync_after_garbage():
+    buf = b'\x00\x5a\x13\xa5garbage\xa5' + packframes(VALUES, SEQ)
+    values, seq, remainder, nbad = parseframes(buf)
+    np.testing.assert_array_equal(values, VALUES)
+    np.testing.assert_array_equal(seq, SEQ)
+    assert remainder == b''
+
+
+def test_crc_mismatch_is_dropped_and_counted():
+    buf = bytearray(packframes(VALUES, SEQ))
+    buf[2 * FRAME_SIZE + 10] ^= 0x01  # a bit error in the third frame's values
+    values, seq, remainder, nbad = parseframes(bytes(buf))
+    np.testing.assert_array_equal(seq, [100, 101, 103, 104])
+    np.testing.assert_array_equal(values, VALUES[[0, 1, 3, 4]])
+    assert nbad == 1
+
+
+def test_truncated_frames_are_counted():
+    frames = packframes(VALUES, SEQ)
+    for keep in (1, 2, 10, FRAME_SIZE - 1):
+        # the third frame cut short, the next one starts right after
+        buf = frames[:2 * FRAME_SIZE + keep] + frames[3 * FRAME_SIZE:]
+        values, seq, remainder, nbad = parseframes(buf)
+        np.testing.assert_array_equal(seq, [100, 101, 103, 104])
+        assert nbad == 1, keep
+
+
+def test_frame_split_across_reads():
+    frames = packframes(VALUES, SEQ)
+    cut = 2 * FRAME_SIZE + 7
+    values1, seq1, remainder, nbad1 = parseframes(frames[:cut])
+    values2, seq2, remainder, nbad2 = parseframes(remainder + frames[cut:])
+    np.testing.assert_array_equal(np.concatenate((seq1, seq2)), SEQ)
+    np.testing.assert_array_equal(np.concatenate((values1, values2)), VALUES)
+    assert remainder == b''
+    assert nbad1 == nbad2 == 0
+
+
+def test_counter_wraparound():
+    seq = np.arange(2 ** 32 - 3, 2 ** 32 + 2)
+    values, raw, remainder, nbad = parseframes(packframes(VALUES, seq))
+    np.testing.assert_array_equal(raw, seq % 2 ** 32)
+    np.testing.assert_array_equal(SampleClock().unwrap(raw), seq)
@@ -0,0 +1,64 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parselines import parselines  # noqa: E402
+from VirtualDensitometer import VirtualDensitometer  # noqa: E402
+
+
+def legacy(buf):
+    """The original per-line parser: split(','), four floats or the line is skipped"""
+    rows = []
+    nbad = 0
+    for line in buf.split(b'\n')[:-1]:
+        fields = line.rstrip(b'\r').split(b',')
+        try:
+            if len(fields) != 4:
+                raise ValueError
+            rows.append([float(v) for v in fields])
+        except ValueError:
+            nbad += 1
+    return np.array(rows).reshape(-1, 4), nbad
+
+
+def test_split_trailing_line_is_kept_for_the_next_chunk():
+    values, remainder, nbad = parselines(b'1,2,3,4\r\n5,6,7,8\r\n9,10,1')
+    np.testing.assert_array_equal(values, [[1, 2, 3, 4], [5, 6, 7, 8]])
+    assert remainder == b'9,10,1'
+    assert nbad == 0
+
+    values, remainder, nbad = parselines(remainder + b'1,12\r\n')
+    np.testing.assert_array_equal(values, [[9, 10, 11, 12]])
+    assert remainder == b''
+
+
+def test_malformed_and_short_rows_are_dropped():
+    buf = b'1,2,3\r\n1,2,,4\r\n#?,,x\r\n1.2.3,2,3,4\r\n5,6,7,8\r\n1,2,3,4,5\r\n'
+    values, remainder, nbad = parselines(buf)
+    np.testing.assert_array_equal(values, [[5, 6, 7, 8]])
+    assert remainder == b''
+    assert nbad == 5
+
+
+def test_matches_legacy_parser_on_emulator_stream():
+    device = VirtualDensitometer(malformed=0.05, seed=1)
+    try:
+        seq = np.arange(1, 3001)
+        buf = device.encode(device.samples(seq), seq)
+    finally:
+        device.close()
+
+    expected, expected_bad = legacy(buf)
+    # read in uneven chunks, as the serial port returns them
+    parsed = []
+    nbad = 0
+    pending = b''
+    for chunk in np.array_split(np.frombuffer(buf, dtype=np.uint8), 97):
+        values, pending, bad = parselines(pending + chunk.tobytes())
+        parsed.append(values)
+        nbad += bad
+    assert pending == b''
+    assert nbad == expected_bad > 0
+    np.testing.assert_array_equal(np.concatenate(parsed), expected)
@@ -0,0 +1,70 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Acquisition import Acquisition  # noqa: E402
+from RecordingJournal import (SUFFIX, RecordingJournal, readjournal,  # noqa: E402
+                              recover)
+from RecordingWriter import RecordingWriter  # noqa: E402
+
+BLOCKS = [np.random.default_rng(i).normal(1, 0.1, (300, 7)) for i in range(4)]
+
+
+def crashed_journal(target, blocks):
+    """A journal left behind by a writer that died: records kept, lock released"""
+    journal = RecordingJournal(target, Acquisition.FIELDS, 'DH-001', 'ICG-01')
+    for block in blocks:
+        journal.append(block)
+    journal.flush()
+    journal.close(remove=False)
+    return target + SUFFIX
+
+
+def readrows(target):
+    return np.loadtxt(target, skiprows=3, delimiter=',', ndmin=2)
+
+
+def test_truncated_record_keeps_the_earlier_ones(tmp_path):
+    target = str(tmp_path / 'rec_Volts.csv')
+    filename = crashed_journal(target, BLOCKS)
+    os.truncate(filename, os.path.getsize(filename) - 100)  # inside the last record
+
+    fields, patient, injection, blocks, nbad = readjournal(filename)
+    assert (fields, patient, injection) == (Acquisition.FIELDS, 'DH-001', 'ICG-01')
+    assert len(blocks) == 3
+    assert nbad == 1
+
+    assert recover(filename) == target
+    np.testing.assert_array_equal(readrows(target), np.concatenate(BLOCKS[:3]))
+    assert not os.path.exists(filename)
+
+
+def test_longer_recording_on_disk_is_kept(tmp_path):
+    target = str(tmp_path / 'rec_Volts.csv')
+    writer = RecordingWriter(target, Acquisition.FIELDS, istart=0, t0=0.0,
+                             journal=False)
+    for block in BLOCKS:
+        writer.append(block)
+    writer.finalize('0', '0')
+
+    # the journal lost its last two records, the file did not
+    filename = crashed_journal(target, BLOCKS[:2])
+    recover(filename)
+    np.testing.assert_array_equal(readrows(target), np.concatenate(BLOCKS))
+
+
+def test_locked_journal_is_left_alone(tmp_path):
+    target = str(tmp_path / 'rec_Volts.csv')
+    journal = RecordingJournal(target, Acquisition.FIELDS)  # writer still running
+    journal.append(BLOCKS[0])
+    journal.flush()
+    try:
+        with pytest.raises(OSError):
+            recover(target + SUFFIX)
+        assert os.path.exists(target + SUFFIX)
+        assert len(readjournal(target + SUFFIX)[3]) == 1
+    finally:
+        journal.close()
@@ -0,0 +1,42 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SampleClock import SampleClock  # noqa: E402
+
+FS = 300
+
+
+def reads(seconds=60, seed=0):
+    """(counters, read time) chunks of a 300 Hz device read with scheduling jitter"""
+    rng = np.random.default_rng(seed)
+    sent = 0
+    t = 0.0
+    while t < seconds:
+        t += rng.uniform(0.005, 0.05)
+        newest = int(t * FS)
+        if newest > sent:
+            yield np.arange(sent + 1, newest + 1), t + rng.exponential(0.004)
+            sent = newest
+
+
+def test_fitted_timestamps_increase_across_chunks():
+    clock = SampleClock(FS)
+    ts = []
+    for counters, host_time in reads():
+        clock.update(counters[-1], host_time)
+        ts.append(clock.timestamps(counters, host_time))
+    ts = np.concatenate(ts)
+    assert np.all(np.diff(ts) > 0)
+    assert abs(clock.fs - FS) < 1
+
+
+def test_without_counter_timestamps_increase_at_nominal_rate():
+    clock = SampleClock(FS)  # ASCII: update() is never called
+    ts = np.concatenate([clock.timestamps(counters, host_time)
+                         for counters, host_time in reads()])
+    assert np.all(np.diff(ts) > 0)
+    assert clock.summary()['fs'] is None
+    assert clock.drift_ppm is None
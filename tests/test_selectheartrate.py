@@ -0,0 +1,40 @@
+import os
+import sys
+import numpy as np
+import pytest
+from scipy import signal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from selectheartrate import selectheartrate  # noqa: E402
+
+
+def pulse(hr, fs=300, seconds=60):
+    t = np.arange(int(fs * seconds)) / fs
+    rng = np.random.default_rng(0)
+    x = np.vstack((1 + 0.01 * np.sin(2 * np.pi * hr / 60 * t),
+                   1 + 0.02 * np.sin(2 * np.pi * hr / 60 * t + 0.3)))
+    return x + 0.001 * rng.standard_normal(x.shape)
+
+
+def test_finds_heart_rate():
+    x = pulse(72)
+    f, P = signal.welch(x, fs=300, nperseg=x.shape[1] // 4)
+    hr, confidence = selectheartrate(f, P, x=x, fs=300)
+    assert hr == pytest.approx(72, abs=0.2)
+    assert 0.5 < confidence <= 1
+
+
+def test_too_few_bins_in_band():
+    # 0.5 s segments: bins 2 Hz apart, only 120 bpm inside 40-200 bpm
+    x = pulse(72, seconds=4)
+    f, P = signal.welch(x, fs=300, nperseg=150)
+    assert np.count_nonzero((f >= 40 / 60) & (f <= 200 / 60)) < 3
+    with pytest.raises(ValueError):
+        selectheartrate(f, P)
+
+
+def test_flat_signal():
+    f = np.linspace(0, 150, 1001)
+    with pytest.raises(ValueError):
+        selectheartrate(f, np.zeros((2, len(f))))
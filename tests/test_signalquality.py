@@ -0,0 +1,58 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Acquisition import Acquisition  # noqa: E402
+from SampleStore import SampleStore  # noqa: E402
+from SignalQuality import SignalQuality  # noqa: E402
+
+FS = 300
+
+
+def probe(seconds=40, hr=72, seed=0):
+    """Rows in Acquisition.CHANNELS order, with a few clipped IR samples"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(seconds * FS) / FS
+    pulse = np.sin(2 * np.pi * hr / 60 * t)
+    red = 1.2 * (1 - 0.010 * pulse) + rng.normal(0, 5e-4, len(t))
+    ir = 1.5 * (1 - 0.012 * pulse) + rng.normal(0, 5e-4, len(t))
+    amb = 0.02 + 0.002 * np.sin(2 * np.pi * 60 * t)
+    rows = np.column_stack((red + amb, ir + amb, amb, amb + 0.005, red, ir, 1000 + t))
+    rows[5000:5020, 1] = 5.0
+    return rows
+
+
+def test_incremental_metrics_match_a_full_computation():
+    rows = probe()
+    store = SampleStore(Acquisition.CHANNELS)
+    quality = SignalQuality()
+    checked = 0
+    for i in range(0, len(rows), 75):  # 250 ms of samples per preview refresh
+        store.append(rows[i:i + 75])
+        metrics = quality.update(store)
+        full = SignalQuality().update(store)
+        if full is None:
+            assert metrics is None
+            continue
+        assert metrics.keys() == full.keys()
+        for key in full:
+            np.testing.assert_allclose(metrics[key], full[key], rtol=1e-9, atol=1e-12)
+        checked += 1
+    assert checked > 100
+    assert abs(metrics['hr'] - 72) < 1
+    assert metrics['clipped'] == 0
+
+
+def test_new_store_restarts_the_window():
+    quality = SignalQuality()
+    store = SampleStore(Acquisition.CHANNELS)
+    store.append(probe(hr=60))
+    assert abs(quality.update(store)['hr'] - 60) < 1
+
+    store = SampleStore(Acquisition.CHANNELS)  # preview restarted
+    store.append(probe(seconds=5))
+    assert quality.update(store) is None
+    store.append(probe(hr=90, seed=1)[5 * FS:])
+    assert abs(quality.update(store)['hr'] - 90) < 1
@@ -0,0 +1,59 @@
+import os
+import sys
+import types
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Acquisition import Acquisition  # noqa: E402
+from SampleStore import SampleStore  # noqa: E402
+from StreamingAIF import StreamingAIF  # noqa: E402
+from TI_to_AIF import TI_to_AIF  # noqa: E402
+
+FS = 300
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def reader_rows(seconds=150, hr=72, bolus_s=70):
+    """RED, IR, RED ambient, IR ambient, timestamp rows as SerialReader yields them"""
+    t = np.arange(int(seconds * FS)) / FS
+    pulse = np.sin(2 * np.pi * hr / 60 * t)
+    dt = np.clip(t - bolus_s, 0, None)
+    c = (dt / 5) ** 2 * np.exp(-dt / 5)  # dye passage
+    amb = np.full_like(t, 0.1)
+    red = 2.0 * (1 + 0.01 * pulse) * (1 - 0.02 * c) + amb
+    ir = 2.5 * (1 + 0.02 * pulse) * (1 - 0.10 * c) + amb
+    return np.column_stack((red, ir, amb, amb, 1000 + t))
+
+
+def test_streamed_aif_matches_saved_recording(tmp_path):
+    rows = reader_rows()
+    chunks = iter(np.array_split(rows, len(rows) // 6))  # 20 ms polls
+
+    # record through the real drain -> SampleStore / RecordingWriter path
+    acq = Acquisition('test')
+    acq.reader = types.SimpleNamespace(ring=types.SimpleNamespace(
+        pop=lambda: next(chunks, np.empty((0, 5)))))
+    acq.record(str(tmp_path / 'rec'), t0=1000.0)
+    while acq.drain():
+        pass
+    acq.reader = None
+    acq.finish('0', '0')
+
+    gui_vars = types.SimpleNamespace(current_dir=REPO, SaO2=0.98, tHb=14)
+    offline = TI_to_AIF(acq.filename('_Volts.csv'), gui_vars, [804, 938],
+                        headless=True)
+    t, Ca = offline.calculate_AIF()
+
+    # replay what the acquisition stored, at the heart rate offline picked
+    streaming = StreamingAIF(gui_vars, hr=offline.x0)
+    store = SampleStore(Acquisition.CHANNELS)
+    for i in range(0, len(acq.data), 6):
+        store.append(np.column_stack([acq.data[name][i:i + 6]
+                                      for name in Acquisition.CHANNELS]))
+        streaming.update(store)
+    ts, Cas = streaming.finish()
+
+    assert len(ts) == len(t)
+    np.testing.assert_allclose(ts, t, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(Cas, Ca, rtol=0, atol=1e-9 * np.ptp(Ca))